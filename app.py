@@ -1,23 +1,76 @@
-import os, json, re, datetime as dt
+import os, json, uuid, time, hashlib, datetime as dt
 from datetime import timezone
-from flask import Flask, redirect, request, session, url_for, render_template, jsonify
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import Flow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+from flask import Flask, Response, redirect, request, session, url_for, render_template, jsonify, flash, stream_with_context, g, abort
+import event_store
+import trips
+import google_client
+import credential_store
+import metrics
+import event_model
+import user_store
+import entry_index
+from cache import from_env as _cache_from_env
 
 # ===== Config =====
 APP_SECRET = os.environ.get("SECRET_KEY", "dev-secret")
 GOOGLE_CLIENT_ID = os.environ["GOOGLE_CLIENT_ID"]
 GOOGLE_CLIENT_SECRET = os.environ["GOOGLE_CLIENT_SECRET"]
 GOOGLE_REDIRECT_URI = os.environ.get("GOOGLE_REDIRECT_URI", "https://your.app/oauth2callback")
-SCOPES = ["https://www.googleapis.com/auth/calendar.readonly"]
+# readonly for calendars.get/calendarList, events for pushes (/reconcile, create_event_safe, retry_pending)
+SCOPES = ["https://www.googleapis.com/auth/calendar.readonly", "https://www.googleapis.com/auth/calendar.events"]
+SYNC_MAX_AGE = int(os.environ.get("SYNC_MAX_AGE", "60"))  # seconds before a page view triggers a delta sync
+SYNC_WORKER = os.environ.get("SYNC_WORKER", "")  # "thread" or "process": background sync, pages only read
+PRELOAD = os.environ.get("PRELOAD") == "1"  # gunicorn --preload: import heavy deps once in the master
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")  # if set, /metrics wants `Authorization: Bearer <token>`
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN")  # if set, `X-Profile: <token>` returns a cProfile report
 
 app = Flask(__name__)
 app.secret_key = APP_SECRET
+cache = _cache_from_env()
+if SYNC_WORKER == "thread" and not PRELOAD:  # with --preload, gunicorn.conf.py starts it after fork
+    import sync_worker; sync_worker.start_thread()
+
+def preload():
+    """Pull the heavy dependencies and one-off tables into memory before workers fork,
+    so they are shared copy-on-write instead of loaded per worker on first request."""
+    import google.oauth2.credentials, google.auth.transport.requests, google_auth_oauthlib.flow  # noqa: F401 - loaded for the side effect
+    import service_pool; service_pool.discovery_doc()
+    import googleapiclient.discovery, httplib2, google_auth_httplib2  # noqa: F401
+    trips.trip_rx()
+    try:
+        import geo_index; geo_index._load()
+        import classifier; classifier._parse_date("today")
+    except Exception as e:  # optional extras; the routes still load them lazily
+        app.logger.warning("preload skipped travel/date tables: %s", e)
+
+# ===== Instrumentation =====
+@app.before_request
+def _start_timer():
+    g.t0 = time.perf_counter()
+    if PROFILE_TOKEN and request.headers.get("X-Profile") == PROFILE_TOKEN:
+        import cProfile
+        g.profiler = cProfile.Profile(); g.profiler.enable()
+
+@app.after_request
+def _record(resp):
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.HTTP_LATENCY.observe(time.perf_counter() - g.t0, route=route, method=request.method, status=resp.status_code)
+    prof = g.pop("profiler", None)
+    if prof is None: return resp
+    import io, pstats
+    prof.disable()
+    out = io.StringIO()
+    pstats.Stats(prof, stream=out).sort_stats("cumulative").print_stats(60)
+    return Response(out.getvalue(), mimetype="text/plain", headers={"X-Profiled-Status": str(resp.status_code)})
+
+@app.route("/metrics")
+def metrics_endpoint():
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}": abort(401)
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 # ===== OAuth Helpers =====
 def _flow():
+    from google_auth_oauthlib.flow import Flow
     return Flow(
         client_config={
             "web": {
@@ -34,99 +87,273 @@ def _flow():
         redirect_uri=GOOGLE_REDIRECT_URI,
     )
 
+def _identify(creds):
+    """The signed-in Google account's email: the primary calendar's id, readable with the calendar scope."""
+    import gapi
+    return gapi.execute(google_client.build_service(creds).calendars().get(calendarId="primary"))["id"].lower()
+
 def _get_creds():
     tok = session.get("token")
     if not tok: return None
-    creds = Credentials.from_authorized_user_info(tok, SCOPES)
-    if creds and creds.expired and creds.refresh_token:
+    if not session.get("email"):  # session from before sign-in recorded the account
         try:
-            creds.refresh(Request())
-            session["token"] = json.loads(creds.to_json())
+            from google.oauth2.credentials import Credentials
+            session["email"] = _identify(Credentials.from_authorized_user_info(tok))
         except Exception:
             session.pop("token", None)
             return None
+        if session.get("uid"): credential_store.drop(session.pop("uid"))  # token once stored under a throwaway key
+    user = _user_key()
+    try:
+        creds = credential_store.get(user)
+        if creds is None:  # session from before the shared store: seed it once
+            from google.oauth2.credentials import Credentials
+            credential_store.put(user, Credentials.from_authorized_user_info(tok))  # scopes as granted, from tok["scopes"]
+            creds = credential_store.get(user)
+    except Exception:
+        session.pop("token", None)
+        return None
     return creds
 
+def _user_key():
+    email = session.get("email")
+    if email: return email.replace("@","_at_").replace(".","_")  # same key google_client files use
+    return session.setdefault("uid", uuid.uuid4().hex)
+
 # ===== Utility =====
 def now_utc_iso(): return dt.datetime.now(timezone.utc).isoformat()
 def in_days_iso(days): return (dt.datetime.now(timezone.utc)+dt.timedelta(days=days)).isoformat()
 
-# Simple regexes to pull travel data
-AIRLINE_HINTS = r"(UA|United|AA|American|DL|Delta|BA|British|LH|Lufthansa|AI|Air India|Vistara|IndiGo)"
-CITY_RX = r"(New York|Los Angeles|San Francisco|Mumbai|Delhi|Bengaluru|Chicago|Miami|London|Paris|Dubai)"
-
 def parse_trips(events):
-    trips = []
-    for ev in events:
-        title = (ev.get("summary") or "") + " " + (ev.get("location") or "")
-        if re.search(AIRLINE_HINTS, title, re.I) or "Flight" in title:
-            trips.append({
-                "type": "flight",
-                "title": ev.get("summary"),
-                "start": ev.get("start"),
-                "end": ev.get("end"),
-                "city": _first_or_none(re.findall(CITY_RX, title, re.I)),
-            })
-        elif "Hotel" in title:
-            trips.append({
-                "type": "hotel",
-                "title": ev.get("summary"),
-                "start": ev.get("start"),
-                "end": ev.get("end"),
-                "city": _first_or_none(re.findall(CITY_RX, title, re.I)),
-            })
+    return trips.extract(events)
+
+# ===== Server-side cache (session only carries the user key) =====
+WINDOW_DAYS = 14
+
+def _version(user):
+    # store revision + the minute the window was cut at; changes whenever the payload can.
+    # revision() is a stat plus the process's parsed copy of the store, so a 304 parses nothing.
+    return f"{event_store.revision(user)}.{int(time.time() // 60)}"
+
+def _parse_version(v):
+    """"rev.minute" -> (rev, minute); a bare revision gives minute None."""
+    rev, _, minute = str(v).partition(".")
+    return int(rev), (int(minute) if minute else None)
+
+def _bounds(minute):
+    return minute * 60, minute * 60 + WINDOW_DAYS * 86400
+
+# The cache holds the serialized JSON arrays (a few hundred bytes per event) rather than objects.
+def _window_events(user, minute=None):
+    lo, hi = _bounds(int(time.time() // 60) if minute is None else minute)
+    return event_store.events(user, event_model.format_iso(lo, 0), event_model.format_iso(hi, 0))
+
+def _cached_events(user, version=None):
+    version = version or _version(user)
+    key = f"events:{user}:{version}"
+    items = cache.get(key)
+    metrics.CACHE_REQUESTS.inc(kind="events", result="miss" if items is None else "hit")
+    if items is None:
+        items = event_model.dumps(_window_events(user, _parse_version(version)[1]))
+        cache.set(key, items)
+    return items
+
+def _cached_trips(user, version=None):
+    version = version or _version(user)
+    trips = cache.get(f"trips:{user}:{version}")
+    metrics.CACHE_REQUESTS.inc(kind="trips", result="miss" if trips is None else "hit")
+    if trips is None:
+        trips = event_model.dumps(parse_trips(_window_events(user, _parse_version(version)[1])))
+        cache.set(f"trips:{user}:{version}", trips)
     return trips
 
-def _first_or_none(seq): return seq[0] if seq else None
+def _json_body(head, **arrays):
+    """Splice pre-serialized JSON arrays into a response object without decoding them."""
+    return json.dumps(head)[:-1] + "".join(f', "{k}": {v}' for k, v in arrays.items()) + "}"
+
+def _conditional(kind, user, build):
+    """Strong ETag from the content version; If-None-Match short-circuits to 304 before serializing.
+    build(version) returns a JSON string."""
+    version = _version(user)
+    etag = hashlib.blake2b(f"{kind}:{user}:{version}".encode(), digest_size=12).hexdigest()
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        resp = Response(build(version), mimetype="application/json")
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+def _entries():
+    email = session.get("email")
+    if not email:
+        return {"email": None, "schedule": [], "dates": [], "other": [], "travel": [], "travel_enabled": False}
+    schedule, dates, other, travel = entry_index.classified(email)
+    return {"email": email, "schedule": schedule, "dates": dates, "other": other, "travel": travel,
+            "travel_enabled": user_store.read_settings(email).get("travel_enabled", False)}
 
 # ===== Routes =====
 @app.route("/")
 def home():
     creds = _get_creds()
+    entries = _entries()
     if not creds:
-        return render_template("index.html", signed_in=False, events=[], error=None)
+        return render_template("index.html", signed_in=False, events=[], error=None, **entries)
     try:
-        service = build("calendar", "v3", credentials=creds, cache_discovery=False)
-        resp = service.events().list(
-            calendarId="primary",
-            singleEvents=True,
-            orderBy="startTime",
-            timeMin=now_utc_iso(),
-            timeMax=in_days_iso(14),
-            maxResults=50
-        ).execute()
-        items = []
-        for ev in resp.get("items", []):
-            s = ev.get("start", {}); e = ev.get("end", {})
-            items.append({
-                "summary": ev.get("summary", "(No title)"),
-                "location": ev.get("location"),
-                "start": s.get("dateTime") or (s.get("date")+"T00:00:00" if s.get("date") else None),
-                "end": e.get("dateTime") or (e.get("date")+"T00:00:00" if e.get("date") else None),
-                "status": ev.get("status"),
-                "htmlLink": ev.get("htmlLink"),
-            })
-        session["last_events"] = items
-        session["last_trips"] = parse_trips(items)
-        return render_template("index.html", signed_in=True, events=items, error=None)
+        user = _user_key()
+        # With a sync worker, only block on the very first seed.
+        if not event_store.seeded(user) or (not SYNC_WORKER and event_store.is_stale(user, SYNC_MAX_AGE)):
+            event_store.sync_all(creds, user)
+        items = _window_events(user)
+        return render_template("index.html", signed_in=True, events=items, error=None, **entries)
     except Exception as ex:
         session["last_error"] = str(ex)
-        return render_template("index.html", signed_in=True, events=[], error="Couldn’t load Google Calendar."), 500
+        return render_template("index.html", signed_in=True, events=[], error="Couldn’t load Google Calendar.", **entries), 500
 
 @app.route("/api/events")
 def api_events():
     try:
-        return jsonify({"ok": True, "items": session.get("last_events", [])})
+        if not session.get("token"):
+            return jsonify({"ok": True, "items": []})
+        user = _user_key()
+        since = request.args.get("since")
+        if since is None:
+            return _conditional("events", user, lambda v: _json_body({"ok": True, "cursor": v}, items=_cached_events(user, v)))
+        try: since_rev, since_minute = _parse_version(since)
+        except ValueError: return jsonify({"ok": False, "error": "since must be a cursor from a previous response"}), 400
+        def delta(v):  # ?since=<cursor>: what changed, entered or left the window since that response
+            rev, minute = _parse_version(v)
+            if since_minute is None:  # bare revision: the window the client holds is unknown
+                ch = {"rev": rev, "full": True}
+            else:
+                ch = event_store.changes_since(user, since_rev, _bounds(minute), _bounds(since_minute))
+            if ch["full"]: return _json_body({"ok": True, **ch, "cursor": v}, items=_cached_events(user, v))
+            changed = event_model.dumps(ch.pop("changed"))  # each Event's JSON is cached on the record
+            return _json_body({"ok": True, **ch, "cursor": f"{ch['rev']}.{minute}"}, changed=changed)
+        return _conditional(f"events-since-{since}", user, delta)
     except Exception as ex:
         return jsonify({"ok": False, "error": str(ex)}), 500
 
+@app.route("/api/events/stream")
+def api_events_stream():
+    """NDJSON (default) or Server-Sent Events for ?timeMin=&timeMax=&calendars=primary,work|all&format=sse."""
+    creds = _get_creds()
+    if not creds:
+        return jsonify({"ok": False, "error": "Not signed in"}), 401
+    time_min = request.args.get("timeMin") or now_utc_iso()
+    time_max = request.args.get("timeMax") or in_days_iso(14)
+    calendars = request.args.get("calendars") or event_store.CALENDARS
+    sse = request.args.get("format") == "sse" or "text/event-stream" in request.headers.get("Accept", "")
+    try: events = event_store.stream(creds, time_min, time_max, calendars)
+    except Exception as ex:
+        return jsonify({"ok": False, "error": str(ex)}), 500
+    def gen():
+        for ev in events:
+            yield f"data: {json.dumps(ev)}\n\n" if sse else json.dumps(ev) + "\n"
+        if sse: yield "event: end\ndata: {}\n\n"
+    return Response(stream_with_context(gen()), mimetype="text/event-stream" if sse else "application/x-ndjson",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.route("/api/travel")
 def api_travel():
     try:
-        return jsonify({"ok": True, "trips": session.get("last_trips", [])})
+        if not session.get("token"):
+            return jsonify({"ok": True, "trips": []})
+        user = _user_key()
+        return _conditional("travel", user, lambda v: _json_body({"ok": True}, trips=_cached_trips(user, v)))
+    except Exception as ex:
+        return jsonify({"ok": False, "error": str(ex)}), 500
+
+# ===== Conflicts / free time =====
+def _range_args(default_days):
+    lo = event_model.parse_iso(request.args.get("timeMin") or now_utc_iso())[0]
+    hi = event_model.parse_iso(request.args.get("timeMax") or in_days_iso(default_days))[0]
+    return lo, hi
+
+@app.route("/api/conflicts")
+def api_conflicts():
+    """Overlapping pairs among synced events and timed entries in ?timeMin=&timeMax= (default 14 days)."""
+    if not session.get("token"):
+        return jsonify({"ok": True, "conflicts": []})
+    try: lo, hi = _range_args(14)
+    except ValueError: return jsonify({"ok": False, "error": "timeMin and timeMax must be ISO 8601 datetimes"}), 400
+    try:
+        import interval_index
+        idx = interval_index.for_user(_user_key(), session.get("email"))
+        pairs = idx.conflicts(lo, hi)
+        return jsonify({"ok": True, "conflicts": [[idx.describe(i), idx.describe(j)] for i, j in pairs]})
     except Exception as ex:
         return jsonify({"ok": False, "error": str(ex)}), 500
 
+@app.route("/api/free")
+def api_free():
+    """Free slots of at least ?minutes= (30) in the range (default 7 days), optionally inside
+    ?dayStart=&dayEnd= hours in ?tz= (defaults LOCAL_TZ)."""
+    if not session.get("token"):
+        return jsonify({"ok": True, "slots": []})
+    try: lo, hi = _range_args(7)
+    except ValueError: return jsonify({"ok": False, "error": "timeMin and timeMax must be ISO 8601 datetimes"}), 400
+    try:
+        import interval_index
+        idx = interval_index.for_user(_user_key(), session.get("email"))
+        day_start, day_end = request.args.get("dayStart", type=float), request.args.get("dayEnd", type=float)
+        windows = None
+        if day_start is not None and day_end is not None:
+            windows = interval_index.work_windows(lo, hi, day_start, day_end, request.args.get("tz") or interval_index.LOCAL_TZ)
+        slots = idx.free(lo, hi, request.args.get("minutes", 30, type=int) * 60, windows)
+        return jsonify({"ok": True, "slots": [{"start": event_model.format_iso(s, 0), "end": event_model.format_iso(e, 0)}
+                                              for s, e in slots]})
+    except Exception as ex:
+        return jsonify({"ok": False, "error": str(ex)}), 500
+
+# ===== Text entries (scheduled_data/<email>.txt) =====
+@app.post("/add")
+def add():
+    email = session.get("email")
+    if not email: flash("Login required."); return redirect(url_for("home"))
+    text = request.form.get("add","").strip()
+    if text: entry_index.add(email, text)
+    return redirect(url_for("home"))
+
+@app.post("/import")
+def import_entries():
+    email = session.get("email")
+    if not email: flash("Login required."); return redirect(url_for("home"))
+    f = request.files.get("file")
+    if not f or not f.filename: flash("Choose an .ics or .csv file."); return redirect(url_for("home"))
+    import importer  # streams the upload; werkzeug spools large files to disk
+    res = importer.import_file(email, f.stream, f.filename)
+    flash(f"Imported {res['imported']} entries."
+          + (f" Skipped {res['skipped']} from other years (entries have no year)." if res["skipped"] else ""))
+    return redirect(url_for("home"))
+
+@app.post("/reconcile")
+def reconcile_entries():
+    email = session.get("email")
+    if not email: flash("Login required."); return redirect(url_for("home"))
+    creds = _get_creds()
+    if not creds: flash("Connect Google Calendar first."); return redirect(url_for("home"))
+    import reconcile
+    res = reconcile.run(email, creds, pull=request.form.get("pull") == "1")
+    if not res["ok"]: flash(res.get("message", "Reconcile failed.")); return redirect(url_for("home"))
+    if res["pushed"]: event_store.sync_all(creds, _user_key())  # pick the new events up now rather than next sync
+    flash(f"Reconciled: {res['pushed']} pushed, {res['pulled']} pulled, {res['matched']} already matched"
+          + (f", {res['failed']} failed." if res["failed"] else "."))
+    return redirect(url_for("home"))
+
+@app.post("/toggle_travel")
+def toggle_travel():
+    email = session.get("email")
+    if not email: flash("Login required."); return redirect(url_for("home"))
+    user_store.toggle_travel(email)
+    return redirect(url_for("home"))
+
+@app.post("/reset")
+def reset():
+    email = session.get("email")
+    if not email: flash("Login required."); return redirect(url_for("home"))
+    user_store.reset_user(email); flash("Data reset."); return redirect(url_for("home"))
+
 @app.route("/login")
 def login():
     flow = _flow()
@@ -140,12 +367,19 @@ def oauth2callback():
     flow.fetch_token(authorization_response=request.url)
     creds = flow.credentials
     session["token"] = json.loads(creds.to_json())
+    session["email"] = _identify(creds)  # entries (/add, /import, /reconcile, ...) are keyed by it
+    google_client.save_creds(creds, _user_key())  # lets the sync worker refresh this user
     return redirect(url_for("home"))
 
 @app.route("/logout")
 def logout():
+    if session.get("email"): credential_store.drop(_user_key())  # the sync worker stops refreshing this user
+    if session.get("uid"): credential_store.drop(session["uid"])
     session.clear()
     return redirect(url_for("home"))
 
+if PRELOAD:
+    preload()
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)), debug=True)
\ No newline at end of file
@@ -0,0 +1,48 @@
+"""
+Parse throughput per grammar: classifier.parse_when fast paths vs. dateparser.parse.
+First checks that imported timed entries list in date order; exits non-zero if not.
+
+    python bench/bench_dates.py [iterations]
+"""
+import os, sys, time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import classifier, importer
+from datetime import datetime
+
+GRAMMARS = {
+    "Mon DD":            ["Aug 24 Graphs", "Dec 31 New Delhi", "Jul 30 Goldman Sachs Bill"],
+    "Mon DD H:MM AM/PM": ["Aug 24 2:30 PM Graphs", "Dec 31 11 PM Party", "Jan 5 9:05 AM Dentist"],
+    "H[:MM] AM/PM":      ["07:00 AM Yoga", "2 PM Lunch", "10:30 pm Sushi Bar"],
+    "ISO":               ["2025-08-24", "2025-08-24T14:30:00", "2025-08-24T14:30:00+05:30"],
+    "free-form":         ["tomorrow 2pm", "next friday", "in 3 days"],
+}
+
+def check_schedule_order() -> bool:
+    """Timed entry lines as importer writes them sort by date, then time, after time-only ones."""
+    y = datetime.now().year
+    recs = [datetime(y, 3, 2, 9), datetime(y, 1, 15, 17, 30), datetime(y, 11, 5, 8), datetime(y, 1, 15, 9)]
+    lines = [importer.to_line({"summary": f"Event {i}", "start": d}) for i, d in enumerate(recs)] + ["7 PM Dinner"]
+    want = ["7 PM Dinner", "Jan 15 9:00 AM Event 3", "Jan 15 5:30 PM Event 1", "Mar 2 9:00 AM Event 0", "Nov 5 8:00 AM Event 2"]
+    got = classifier.classify(lines)[0]
+    if got != want: print(f"FAIL: schedule order {got}"); return False
+    return True
+
+def rate(fn, samples, n):
+    t0 = time.perf_counter()
+    for i in range(n): fn(samples[i % len(samples)])
+    return n / (time.perf_counter() - t0)
+
+def main():
+    if not check_schedule_order(): sys.exit(1)
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    t0 = time.perf_counter(); import dateparser; imp = time.perf_counter() - t0
+    dateparser.parse("warm up")
+    print(f"dateparser import: {imp * 1000:.0f} ms (paid lazily, only by free-form input)")
+    print(f"{'grammar':20} {'fast path/s':>14} {'dateparser/s':>14} {'speedup':>8}")
+    for name, samples in GRAMMARS.items():
+        fast = rate(classifier.parse_when, samples, n)
+        slow = rate(dateparser.parse, samples, n)
+        print(f"{name:20} {fast:14,.0f} {slow:14,.0f} {fast / slow:7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Memory and serialization cost of a user's cached events: per-event dicts (what the cache used to
+hold) vs. slotted event_model.Event records vs. the pre-serialized JSON the cache now stores.
+
+    python bench/bench_event_model.py [events]
+"""
+import os, sys, json, time, random, tracemalloc, datetime as dt
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import event_model
+
+def corpus(n: int, seed: int = 7) -> list[dict]:
+    rnd = random.Random(seed)
+    t0 = dt.datetime(2030, 1, 1, tzinfo=dt.timezone(dt.timedelta(hours=5, minutes=30)))
+    out = []
+    for i in range(n):
+        s = t0 + dt.timedelta(minutes=30 * i)
+        out.append({"id": f"{rnd.getrandbits(64):016x}{i}", "summary": rnd.choice(["Standup", "1:1", "Flight to Paris", "Lunch"]),
+                    "location": rnd.choice([None, "Room 4", "Zoom"]), "start": s.isoformat(),
+                    "end": (s + dt.timedelta(minutes=30)).isoformat(), "status": "confirmed",
+                    "htmlLink": f"https://www.google.com/calendar/event?eid={i:012d}"})
+    return out
+
+def measure(build):
+    tracemalloc.start()
+    obj = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return obj, size
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    raw = [json.dumps(ev) for ev in corpus(n)]  # what the store hands over, before per-event objects exist
+    dicts, dict_bytes = measure(lambda: [dict(json.loads(r), calendarId="primary") for r in raw])
+    events, ev_bytes = measure(lambda: [event_model.Event.from_normalized(json.loads(r), "primary") for r in raw])
+    cached = event_model.dumps(events)
+    json_bytes = sys.getsizeof(cached)  # the one string the cache keeps
+    t0 = time.perf_counter(); json.dumps(dicts); t_dicts = time.perf_counter() - t0
+    t0 = time.perf_counter(); event_model.dumps(events); t_cached = time.perf_counter() - t0
+    print(f"{n:,} events")
+    print(f"dicts:          {dict_bytes / n:7.0f} B/event")
+    print(f"Event (slots):  {ev_bytes / n:7.0f} B/event")
+    print(f"cached JSON:    {json_bytes / n:7.0f} B/event  ({dict_bytes / json_bytes:.1f}x smaller than dicts)")
+    print(f"serialize: json.dumps(dicts) {t_dicts * 1000:7.1f} ms, dumps(events) after first {t_cached * 1000:7.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Travel detection on a 10k-line user file: per-line GeoText + pycountry.countries.lookup
+(the old is_travel) vs. the precomputed geo_index.
+
+    python bench/bench_geo.py [lines]
+"""
+import os, sys, time, random
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import geo_index
+
+def legacy(tail: str) -> bool:
+    from geotext import GeoText
+    import pycountry
+    def match(word):
+        w = word.upper().strip(".,;:!?")
+        w = geo_index.ALIASES.get(w, w)
+        try: return pycountry.countries.lookup(w) is not None
+        except LookupError: return False
+    geo = GeoText(tail)
+    return bool(geo.cities or geo.countries) or any(match(tok) for tok in tail.split())
+
+def lines(n: int, seed: int = 3) -> list[str]:
+    rnd = random.Random(seed)
+    tails = ["London", "New Delhi", "Renew Leela Stay", "Mom's Bday", "Business Plan", "Graphs", "Paris trip",
+             "USA visa interview", "Dentist checkup", "Board meeting", "UAE conference", "Hash Tables", "Flight to Tokyo",
+             "Data Str. - Final Project", "Goldman Sachs Bill", "Trees", "Pay rent", "Visit Rio de Janeiro"]
+    return [f"{rnd.choice(tails)} {rnd.randint(1, 99)}" for _ in range(n)]
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    tails = lines(n)
+    t0 = time.perf_counter(); geo_index._load(); load = time.perf_counter() - t0
+    t0 = time.perf_counter(); new = [geo_index.names_place(t) for t in tails]; fast = time.perf_counter() - t0
+    legacy("warm up imports")
+    t0 = time.perf_counter(); old = [legacy(t) for t in tails]; slow = time.perf_counter() - t0
+    print(f"{n:,} lines; index load {load * 1000:.1f} ms")
+    print(f"GeoText + pycountry: {slow:7.3f} s  ({slow / n * 1e6:8.1f} us/line)")
+    print(f"geo_index:           {fast:7.3f} s  ({fast / n * 1e6:8.1f} us/line)")
+    print(f"agreement: {sum(a == b for a, b in zip(old, new)) / n:.2%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Query latency of interval_index over a year of events: overlap lookups, conflict pairs and
+free-slot search inside working hours (NumPy if installed, else the bisect fallback).
+First checks that schedule lines with a time anywhere become local intervals without the
+free-form date parser; exits non-zero if not.
+
+    python bench/bench_intervals.py [events] [queries]
+"""
+import os, sys, time, random
+from datetime import datetime
+from zoneinfo import ZoneInfo
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import interval_index
+
+LOCAL_CASES = [  # schedule line -> local start, with "now" = 2026-10-16 08:00
+    ("Dentist at 3 PM", datetime(2026, 10, 16, 15, 0)),
+    ("Call Bob 4:30pm", datetime(2026, 10, 16, 16, 30)),
+    ("9 AM standup", datetime(2026, 10, 16, 9, 0)),
+    ("Oct 18 review with Priya 11:15 AM", datetime(datetime.now().year, 10, 18, 11, 15)),
+]
+
+def check_local() -> bool:
+    tz, now, ok = ZoneInfo("UTC"), datetime(2026, 10, 16, 8, 0), True
+    for n, (line, want) in enumerate(LOCAL_CASES):
+        row = interval_index._local_row(n, line, now, tz)
+        got = row and datetime.fromtimestamp(row[0], tz).replace(tzinfo=None)
+        if got != want: print(f"FAIL: {line!r} -> {got}, want {want}"); ok = False
+    if "dateparser" in sys.modules: print("FAIL: local rows went through dateparser"); ok = False
+    return ok
+
+def main():
+    if not check_local(): sys.exit(1)
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    q = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    rnd, t0 = random.Random(7), 1_767_225_600  # 2026-01-01
+    rows = []
+    for i in range(n):
+        s = t0 + rnd.randrange(0, 365 * 86400) // 900 * 900
+        rows.append((s, s + rnd.choice([1800, 3600, 5400]), (str(i), "Event", "google", 0)))
+    t = time.perf_counter(); idx = interval_index.IntervalIndex(rows); build = time.perf_counter() - t
+    weeks = [t0 + rnd.randrange(0, 358) * 86400 for _ in range(q)]
+    windows = {w: interval_index.work_windows(w, w + 7 * 86400, 9, 18, "UTC") for w in weeks}
+    def timed(fn):
+        t = time.perf_counter()
+        for w in weeks: fn(w)
+        return (time.perf_counter() - t) / q * 1e6
+    print(f"{n:,} events over a year, {'numpy' if idx.np else 'pure python'}; build {build * 1000:.1f} ms")
+    print(f"overlapping(week):     {timed(lambda w: idx.overlapping(w, w + 7 * 86400)):8.1f} us")
+    print(f"conflicts(week):       {timed(lambda w: idx.conflicts(w, w + 7 * 86400)):8.1f} us")
+    print(f"free(week, 9-18, 30m): {timed(lambda w: idx.free(w, w + 7 * 86400, 1800, windows[w])):8.1f} us")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Flush a pending-write backlog against the local fake Calendar server:
+serial gapi.execute(insert()) per item vs. google_client.retry_pending() batches. Both go through
+gapi's limiter, raised here so it measures round trips; in production the per-user bucket
+(GAPI_USER_QPS, charged per inner request) caps either path at the same items/s.
+Then checks the batched run: every queued item inserted exactly once and the queue empty;
+exits non-zero otherwise.
+
+    python bench/bench_retry_pending.py [items] [latency_ms] [rate_limit]
+"""
+import os, sys, time, tempfile, datetime as dt
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_gcal import serve
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 20
+    rate_limit = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    srv, cal = serve(latency_ms=latency, rate_limit=rate_limit)
+    os.environ["CALENDAR_ROOT_URL"] = f"http://127.0.0.1:{srv.server_port}/"
+    os.environ["PERSIST_DIR"] = tempfile.mkdtemp(prefix="bench_pending_")
+    os.environ.setdefault("BATCH_BACKOFF_BASE", "0.05")
+    for k in ("GAPI_USER_QPS", "GAPI_USER_BURST", "GAPI_PROJECT_QPS", "GAPI_PROJECT_BURST"): os.environ.setdefault(k, "1e6")
+
+    from flask import Flask, session
+    from google.oauth2.credentials import Credentials
+    import gapi
+    import google_client
+
+    app = Flask(__name__); app.secret_key = "bench"
+    with app.test_request_context():
+        session["email"] = "bench@example.com"
+        google_client.save_creds(Credentials(token="bench", refresh_token="bench", client_id="bench",
+                                             client_secret="bench", token_uri="https://oauth2.googleapis.com/token",
+                                             expiry=dt.datetime.utcnow() + dt.timedelta(days=1)))
+        body = {"summary": "Bench", "start": {"dateTime": "2030-01-01T09:00:00"}, "end": {"dateTime": "2030-01-01T10:00:00"}}
+        items = [{"id": f"q{i}", "calendar_id": "primary", "body": body, "queued_at": ""} for i in range(n)]
+
+        ok, svc = google_client.ensure_authed()
+        t0 = time.perf_counter()
+        for it in items:
+            try: gapi.execute(svc.events().insert(calendarId=it["calendar_id"], body=it["body"]))
+            except Exception: pass
+        serial = time.perf_counter() - t0
+
+        for i, it in enumerate(items): google_client._queue(dict(it["body"], summary=f"Queued {i}"), it["calendar_id"])
+        t0 = time.perf_counter()
+        res = google_client.retry_pending()
+        batched = time.perf_counter() - t0
+
+    print(f"{n} items, {latency:g} ms server latency, {rate_limit:.0%} throttled")
+    print(f"serial:  {serial:7.2f} s  ({n / serial:8.1f} items/s)")
+    print(f"batched: {batched:7.2f} s  ({n / batched:8.1f} items/s)  {res}")
+    print(f"server:  {cal.stats}")
+    with cal.lock: inserted = [ev["summary"] for ev in cal.calendars["primary"].values() if ev["summary"].startswith("Queued ")]
+    missing = n - len(set(inserted)); dupes = len(inserted) - len(set(inserted))
+    if missing or dupes or res["remaining"]:
+        print(f"FAIL: {missing} never inserted, {dupes} inserted twice, {res['remaining']} left in the queue")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Cost of getting a Calendar service: build() every call, a cold pool miss (what a new thread or a
+new credential pays: build_from_document on the cached, already-parsed discovery document) and a
+warm pool hit. Runs offline (bundled discovery document, no API calls).
+
+    python bench/bench_service_pool.py [iterations]
+"""
+import os, sys, time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from google.oauth2.credentials import Credentials
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build, build_from_document
+import service_pool
+
+def _time(fn, n):
+    t0 = time.perf_counter()
+    for _ in range(n): fn()
+    return (time.perf_counter() - t0) / n * 1000
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    creds = Credentials(token="bench", refresh_token="bench-refresh", client_id="bench", client_secret="bench",
+                        token_uri="https://oauth2.googleapis.com/token")
+    raw = discovery_cache.get_static_doc("calendar", "v3")
+    before = _time(lambda: build("calendar", "v3", credentials=creds, cache_discovery=False), n)
+    from_str = _time(lambda: build_from_document(raw, credentials=creds), n)
+    def cold():
+        service_pool.evict(creds)
+        service_pool.get_service(creds)
+    miss = _time(cold, n)
+    service_pool.get_service(creds)  # warm
+    hit = _time(lambda: service_pool.get_service(creds), n)
+    print(f"build() per request:                 {before:9.3f} ms")
+    print(f"build_from_document(json string):    {from_str:9.3f} ms")
+    print(f"get_service() miss (parsed doc):     {miss:9.3f} ms")
+    print(f"get_service() hit:                   {hit:9.3f} ms")
+    print(f"hit speedup over build(): {before / hit:,.0f}x")
+
+if __name__ == "__main__":
+    main()
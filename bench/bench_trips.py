@@ -0,0 +1,74 @@
+"""
+Trip extraction throughput over a synthetic corpus: the old per-event re.search/re.findall
+with uncompiled 11-city patterns vs. trips.extract() (one compiled gazetteer scan).
+
+First checks trips.classify_text against TRIP_CASES; exits non-zero on a mismatch.
+
+    python bench/bench_trips.py [events]
+"""
+import os, sys, re, time, random
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import trips
+from event_model import Event
+
+AIRLINE_HINTS = r"(UA|United|AA|American|DL|Delta|BA|British|LH|Lufthansa|AI|Air India|Vistara|IndiGo)"
+CITY_RX = r"(New York|Los Angeles|San Francisco|Mumbai|Delhi|Bengaluru|Chicago|Miami|London|Paris|Dubai)"
+
+TRIP_CASES = [  # title -> (kind, flight number) or None
+    ("AI 101 to Delhi", ("flight", "AI101")),
+    ("UA 123 to Chicago", ("flight", "UA123")),
+    ("UA 123 → Chicago", ("flight", "UA123")),
+    ("Flight AI 101 Mumbai", ("flight", "AI101")),
+    ("MS 365 rollout in Dallas", None),
+    ("LA 2028 Olympics prep, Paris", None),
+    ("SA 20 Johannesburg board", None),
+    ("TR 3 London", None),
+    ("Win AM 10 in Denver", None),
+    ("Review PR 482", None),
+    ("American Express review", None),
+]
+
+def check() -> bool:
+    ok = True
+    for title, want in TRIP_CASES:
+        hit = trips.classify_text(title)
+        got = hit and (hit[0], hit[3])
+        if got != want: print(f"FAIL: {title!r} -> {hit}, want {want}"); ok = False
+    return ok
+
+def legacy(events):
+    out = []
+    for ev in events:
+        title = (ev.get("summary") or "") + " " + (ev.get("location") or "")
+        if re.search(AIRLINE_HINTS, title, re.I) or "Flight" in title or "Hotel" in title:
+            found = re.findall(CITY_RX, title, re.I)
+            out.append(found[0] if found else None)
+    return out
+
+def corpus(n: int, seed: int = 7) -> list[dict]:
+    rnd = random.Random(seed)
+    cities = trips.GAZETTEER["cities"]; codes = trips.AIRLINE_CODES; airports = list(trips.AIRPORT_CITY)
+    plain = ["Standup", "1:1 with manager", "Dentist", "Lunch with Priya", "Quarterly review", "Yoga", "Code review"]
+    def one():
+        r = rnd.random()
+        if r < 0.1: return {"summary": f"{rnd.choice(codes)} {rnd.randint(1, 999)} {rnd.choice(airports)} to {rnd.choice(airports)}"}
+        if r < 0.15: return {"summary": f"{rnd.choice(codes)} {rnd.randint(1, 999)} to {rnd.choice(cities)}"}
+        if r < 0.2: return {"summary": "Hotel check-in", "location": rnd.choice(cities)}
+        if r < 0.3: return {"summary": f"Flight to {rnd.choice(cities)}"}
+        return {"summary": rnd.choice(plain), "location": rnd.choice(["Room 4", "", "Zoom", rnd.choice(cities)])}
+    return [one() for _ in range(n)]
+
+def main():
+    if not check(): sys.exit(1)
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    events = corpus(n)
+    records = [Event.from_normalized(dict(ev, id=str(i)), "primary") for i, ev in enumerate(events)]
+    t0 = time.perf_counter(); legacy(events); old = time.perf_counter() - t0
+    t0 = time.perf_counter(); found = trips.extract(records); new = time.perf_counter() - t0
+    print(f"{n:,} events, gazetteer: {len(trips.GAZETTEER['cities'])} cities, "
+          f"{len(trips.AIRPORT_CITY)} airports, {len(trips.GAZETTEER['airlines'])} airlines")
+    print(f"legacy parse_trips: {old:6.2f} s  ({n / old:10,.0f} events/s)")
+    print(f"trips.extract:      {new:6.2f} s  ({n / new:10,.0f} events/s)  {len(found):,} trips")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""
+Startup regression check: `python -X importtime -c "import app"` must stay under a budget
+and must not pull in the heavy dependencies that routes load lazily. Exits non-zero on failure.
+
+    python bench/check_importtime.py [budget_ms]      # or IMPORT_BUDGET_MS=...
+"""
+import os, sys, subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_MS = float(sys.argv[1] if len(sys.argv) > 1 else os.getenv("IMPORT_BUDGET_MS", "400"))
+LAZY = ("googleapiclient.discovery", "google_auth_oauthlib", "google.oauth2.credentials", "httplib2",
+        "dateparser", "dateutil", "geotext", "pycountry", "numpy")
+
+def main():
+    env = dict(os.environ, GOOGLE_CLIENT_ID="x", GOOGLE_CLIENT_SECRET="x", PRELOAD="0", SYNC_WORKER="")
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], cwd=ROOT, env=env,
+                         capture_output=True, text=True)
+    if out.returncode:
+        print(out.stderr[-2000:]); sys.exit(out.returncode)
+    rows = [ln.split("|") for ln in out.stderr.splitlines() if ln.startswith("import time:") and "|" in ln]
+    cumulative = {r[2].strip(): int(r[1]) for r in rows[1:]}
+    total_ms = cumulative["app"] / 1000
+    eager = [m for m in LAZY if any(name == m or name.startswith(m + ".") for name in cumulative)]
+    print(f"import app: {total_ms:.0f} ms (budget {BUDGET_MS:.0f} ms)")
+    for name, us in sorted(cumulative.items(), key=lambda kv: -kv[1])[:8]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+    if eager: print(f"FAIL: imported eagerly: {', '.join(eager)}")
+    if total_ms > BUDGET_MS: print("FAIL: over budget")
+    sys.exit(1 if eager or total_ms > BUDGET_MS else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Local stand-in for the Google Calendar API, for offline throughput runs.
+Serves events.list (paging, timeMin/timeMax, orderBy, syncToken deltas and 410 on expired tokens),
+events.insert, calendarList.list, the batch endpoint and an OAuth token endpoint, with injected
+latency, 429s and 5xx errors.
+
+    python bench/fake_gcal.py --port 8765 --latency-ms 20 --rate-limit 0.05 --error-rate 0.01 --seed 2000
+
+Point the app at it with CALENDAR_ROOT_URL=http://127.0.0.1:8765/ (and token_uri=<that>/token).
+"""
+import argparse, json, random, threading, time, uuid, datetime as dt
+from zoneinfo import ZoneInfo
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+
+RATE_LIMITED = {"error": {"code": 429, "message": "Rate Limit Exceeded", "errors": [{"reason": "rateLimitExceeded"}]}}
+UNAVAILABLE = {"error": {"code": 503, "message": "Backend Error", "errors": [{"reason": "backendError"}]}}
+GONE = {"error": {"code": 410, "message": "Sync token is no longer valid", "errors": [{"reason": "fullSyncRequired"}]}}
+
+def _rfc3339(when: dict) -> dict:
+    """Like the real API: a naive dateTime is read in its timeZone and returned with that offset."""
+    if "dateTime" not in when: return when
+    d = dt.datetime.fromisoformat(when["dateTime"].replace("Z", "+00:00"))
+    if d.tzinfo is None: d = d.replace(tzinfo=ZoneInfo(when.get("timeZone") or "UTC"))
+    return dict(when, dateTime=d.isoformat())
+
+class FakeCalendar:
+    def __init__(self, latency_ms: float = 0, rate_limit: float = 0.0, error_rate: float = 0.0, page_max: int = 2500):
+        self.latency, self.rate_limit, self.error_rate, self.page_max = latency_ms / 1000, rate_limit, error_rate, page_max
+        self.calendars: dict[str, dict[str, dict]] = {"primary": {}}
+        self.seq, self.min_sync = 0, 0  # change counter; sync tokens below min_sync get 410
+        self.lock = threading.Lock()
+        self.stats = {"batches": 0, "inserts": 0, "lists": 0, "throttled": 0, "errors": 0}
+
+    def _fault(self) -> tuple[int, dict] | None:
+        r = random.random()
+        if r < self.rate_limit:
+            with self.lock: self.stats["throttled"] += 1
+            return 429, RATE_LIMITED
+        if r < self.rate_limit + self.error_rate:
+            with self.lock: self.stats["errors"] += 1
+            return 503, UNAVAILABLE
+        return None
+
+    def _store(self, calendar_id: str, ev: dict) -> dict:
+        ev = dict(ev, **{k: _rfc3339(ev[k]) for k in ("start", "end") if k in ev})
+        with self.lock:
+            self.seq += 1
+            ev = dict(ev, _seq=self.seq, updated=dt.datetime.now(dt.timezone.utc).isoformat())
+            self.calendars.setdefault(calendar_id, {})[ev["id"]] = ev
+        return ev
+
+    def insert(self, calendar_id: str, body: dict) -> tuple[int, dict]:
+        fault = self._fault()
+        if fault: return fault
+        ev = self._store(calendar_id, dict(body, id=uuid.uuid4().hex, status="confirmed", organizer={"email": calendar_id}))
+        with self.lock: self.stats["inserts"] += 1
+        return 200, _public(ev)
+
+    def cancel(self, calendar_id: str, event_id: str):
+        ev = self.calendars[calendar_id][event_id]
+        self._store(calendar_id, dict(ev, status="cancelled"))
+
+    def seed(self, n: int, calendar_id: str = "primary", days: int = 30, titles=None):
+        """n timed events spread over the next `days` days (mix of plain, flight and hotel titles)."""
+        titles = titles or ["Standup", "1:1", "Flight AI 101 to Mumbai", "Hotel check-in Paris", "Lunch", "Review"]
+        now = dt.datetime.now(dt.timezone.utc).replace(minute=0, second=0, microsecond=0)
+        for i in range(n):
+            start = now + dt.timedelta(minutes=int(i * days * 24 * 60 / max(n, 1)))
+            self._store(calendar_id, {"id": uuid.uuid4().hex, "status": "confirmed", "summary": titles[i % len(titles)],
+                                      "start": {"dateTime": start.isoformat()},
+                                      "end": {"dateTime": (start + dt.timedelta(minutes=30)).isoformat()}})
+
+    def expire_sync_tokens(self):
+        with self.lock: self.min_sync = self.seq + 1
+
+    def list(self, calendar_id: str, q: dict) -> tuple[int, dict]:
+        fault = self._fault()
+        if fault: return fault
+        with self.lock:
+            self.stats["lists"] += 1
+            evs = list(self.calendars.get(calendar_id, {}).values())
+            seq, min_sync = self.seq, self.min_sync
+        if "syncToken" in q:
+            since = int(q["syncToken"])
+            if since < min_sync: return 410, GONE
+            evs = [e for e in evs if e["_seq"] > since]
+        else:
+            evs = [e for e in evs if e.get("status") != "cancelled"]
+            if "timeMin" in q: evs = [e for e in evs if _ts(e["end"]) > _ts_q(q["timeMin"])]
+            if "timeMax" in q: evs = [e for e in evs if _ts(e["start"]) < _ts_q(q["timeMax"])]
+        evs.sort(key=(lambda e: _ts(e["start"])) if q.get("orderBy") == "startTime" else (lambda e: e["_seq"]))
+        size = min(int(q.get("maxResults", 250)), self.page_max)
+        offset = int(q.get("pageToken") or 0)
+        page = {"kind": "calendar#events", "items": [_public(e) for e in evs[offset:offset + size]]}
+        if offset + size < len(evs): page["nextPageToken"] = str(offset + size)
+        else: page["nextSyncToken"] = str(seq)
+        return 200, page
+
+    def calendar_list(self) -> tuple[int, dict]:
+        with self.lock: ids = list(self.calendars)
+        return 200, {"kind": "calendar#calendarList",
+                     "items": [{"id": cid, "summary": cid, "selected": True, "primary": cid == "primary",
+                                "accessRole": "owner"} for cid in ids]}
+
+def _public(ev: dict) -> dict:
+    return {k: v for k, v in ev.items() if k != "_seq"}
+
+def _ts(when: dict) -> float:
+    iso = when.get("dateTime") or when.get("date") + "T00:00:00+00:00"
+    d = dt.datetime.fromisoformat(iso.replace("Z", "+00:00"))
+    return (d if d.tzinfo else d.replace(tzinfo=dt.timezone.utc)).timestamp()
+
+def _ts_q(iso: str) -> float:
+    return _ts({"dateTime": iso})
+
+def _split_parts(body: bytes, content_type: str):
+    msg = BytesParser(policy=HTTP).parsebytes(b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + body)
+    for part in msg.iter_parts():
+        yield part["Content-ID"], part.get_payload(decode=True) or part.get_payload().encode()
+
+def _parse_inner(raw: bytes) -> tuple[str, str, dict]:
+    head, _, body = raw.replace(b"\r\n", b"\n").partition(b"\n\n")
+    method, path, _ = head.split(b"\n", 1)[0].decode().split(" ", 2)
+    return method, path, json.loads(body or b"{}")
+
+def _calendar_id(path: str) -> str:
+    return unquote(path.split("/calendars/", 1)[1].split("/", 1)[0])
+
+def make_handler(cal: FakeCalendar):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        def log_message(self, *a): pass
+
+        def _send(self, status: int, body: bytes, ctype: str = "application/json"):
+            self.send_response(status)
+            self.send_header("Content-Type", ctype); self.send_header("Content-Length", str(len(body)))
+            self.end_headers(); self.wfile.write(body)
+
+        def _json(self, status: int, payload: dict):
+            self._send(status, json.dumps(payload).encode())
+
+        def do_GET(self):
+            if cal.latency: time.sleep(cal.latency)
+            url = urlsplit(self.path)
+            q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            if url.path.endswith("/users/me/calendarList"): return self._json(*cal.calendar_list())
+            if "/calendars/" in url.path and url.path.endswith("/events"): return self._json(*cal.list(_calendar_id(url.path), q))
+            self._json(404, {"error": "not found"})
+
+        def do_POST(self):
+            raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if cal.latency: time.sleep(cal.latency)
+            if self.path.startswith("/batch"):
+                return self._batch(raw)
+            if self.path.startswith("/token"):  # OAuth refresh: hand out a fresh bearer token
+                return self._json(200, {"access_token": uuid.uuid4().hex, "expires_in": 3600, "token_type": "Bearer"})
+            if "/events" in self.path:
+                return self._json(*cal.insert(_calendar_id(self.path), json.loads(raw or b"{}")))
+            self._json(404, {"error": "not found"})
+
+        def _batch(self, raw: bytes):
+            with cal.lock: cal.stats["batches"] += 1
+            boundary = "batch_" + uuid.uuid4().hex
+            out = []
+            for cid, inner in _split_parts(raw, self.headers["Content-Type"]):
+                method, path, body = _parse_inner(inner)
+                status, payload = cal.insert(_calendar_id(path), body)
+                out.append(f"--{boundary}\r\nContent-Type: application/http\r\n"
+                           f"Content-ID: <response-{cid.strip('<>')}>\r\n\r\n"
+                           f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                           f"Content-Type: application/json\r\n\r\n{json.dumps(payload)}\r\n")
+            out.append(f"--{boundary}--\r\n")
+            self._send(200, "".join(out).encode(), f"multipart/mixed; boundary={boundary}")
+    return Handler
+
+def serve(port: int = 0, seed: int = 0, **kw) -> tuple[ThreadingHTTPServer, FakeCalendar]:
+    """Start the fake server on a background thread; port 0 picks a free one."""
+    cal = FakeCalendar(**kw)
+    if seed: cal.seed(seed)
+    srv = ThreadingHTTPServer(("127.0.0.1", port), make_handler(cal))
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv, cal
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency-ms", type=float, default=0)
+    ap.add_argument("--rate-limit", type=float, default=0.0, help="fraction of requests answered with 429")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    ap.add_argument("--seed", type=int, default=0, help="events to pre-create in the primary calendar")
+    a = ap.parse_args()
+    srv, _ = serve(a.port, seed=a.seed, latency_ms=a.latency_ms, rate_limit=a.rate_limit, error_rate=a.error_rate)
+    print(f"fake Calendar API on http://127.0.0.1:{srv.server_port}/")
+    threading.Event().wait()
@@ -0,0 +1,127 @@
+"""
+Load driver: runs the app in-process against the fake Calendar server and reports latency
+percentiles and throughput for /, /api/events, /api/travel, the gcal create path and retry_pending.
+
+    python bench/loadgen.py --users 20 --concurrency 8 --duration 10 --seed 2000 --latency-ms 20
+    python bench/loadgen.py --scenarios api_events,api_travel --error-rate 0.02
+    python bench/loadgen.py --scenarios home   # needs templates/index.html, which this tree doesn't ship
+
+HTTP scenarios go through a real threaded WSGI server. create and retry_pending call google_client
+directly (they have no route); each retry_pending op queues --backlog items and then flushes them.
+"""
+import os, sys, json, time, uuid, random, logging, argparse, tempfile, threading, urllib.request
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fake_gcal import serve
+
+SCENARIOS = ("home", "api_events", "api_travel", "create", "retry_pending")
+DEFAULT_SCENARIOS = SCENARIOS[1:]
+
+def _pct(xs: list[float], p: float) -> float:
+    return xs[min(len(xs) - 1, int(round(p / 100 * (len(xs) - 1))))] if xs else float("nan")
+
+def _setup(a):
+    srv, cal = serve(seed=a.seed, latency_ms=a.latency_ms, rate_limit=a.rate_limit, error_rate=a.error_rate)
+    fake = f"http://127.0.0.1:{srv.server_port}"
+    os.environ["CALENDAR_ROOT_URL"] = fake + "/"
+    os.environ["PERSIST_DIR"] = tempfile.mkdtemp(prefix="bench_load_")
+    os.environ.setdefault("GOOGLE_CLIENT_ID", "bench"); os.environ.setdefault("GOOGLE_CLIENT_SECRET", "bench")
+    os.environ.setdefault("BATCH_BACKOFF_BASE", "0.05"); os.environ.setdefault("GAPI_BACKOFF_BASE", "0.05")
+
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # no access log line per request
+    import app as webapp
+    http = make_server("127.0.0.1", 0, webapp.app, threaded=True)
+    threading.Thread(target=http.serve_forever, daemon=True).start()
+    signer = webapp.app.session_interface.get_signing_serializer(webapp.app)
+    users, expiry = [], time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + 86400))
+    for i in range(a.users):
+        email = f"user{i}@bench.example"
+        token = {"token": uuid.uuid4().hex, "refresh_token": f"r{i}", "client_id": "bench", "client_secret": "bench",
+                 "token_uri": fake + "/token", "scopes": webapp.SCOPES,
+                 "expiry": expiry}  # google-auth treats a token without one as expired and refreshes against Google
+        users.append({"email": email, "token": token, "cookie": f"session={signer.dumps({'token': token, 'email': email})}"})
+    return webapp, f"http://127.0.0.1:{http.server_port}", cal, users
+
+def _ops(webapp, base: str, a):
+    import google_client, pending_queue
+    def get(path):
+        def op(u):
+            req = urllib.request.Request(base + path, headers={"Cookie": u["cookie"]})
+            with urllib.request.urlopen(req) as resp: resp.read()
+        return op
+    def in_session(u, fn):
+        with webapp.app.test_request_context():
+            webapp.session["email"] = u["email"]
+            return fn()
+    body = {"summary": "Bench", "start": {"dateTime": "2030-01-01T09:00:00Z"}, "end": {"dateTime": "2030-01-01T10:00:00Z"}}
+    def create(u):
+        title = f"Bench {uuid.uuid4().hex[:8]}"  # distinct fingerprints, so every op really inserts
+        res = in_session(u, lambda: google_client.create_event_safe(title, body["start"]["dateTime"], body["end"]["dateTime"]))
+        if not res["ok"]: raise RuntimeError(res.get("error") or res["message"])
+    def retry(u):
+        key = u["email"].replace("@", "_at_").replace(".", "_")  # same key app._user_key() derives
+        for _ in range(a.backlog): pending_queue.enqueue(key, body)
+        res = google_client.retry_pending(key)
+        if res["failed"]: raise RuntimeError(f"{res['failed']} kept in queue")  # remaining may be another op's, claimed elsewhere
+    return {"home": get("/"), "api_events": get("/api/events"), "api_travel": get("/api/travel"),
+            "create": create, "retry_pending": retry}
+
+def _seed(users: list):
+    """Store each user's token and run the first sync, as sign-in plus the first page view would."""
+    from google.oauth2.credentials import Credentials
+    import credential_store, event_store
+    for u in users:
+        key = u["email"].replace("@", "_at_").replace(".", "_")
+        credential_store.put(key, Credentials.from_authorized_user_info(u["token"]))
+        event_store.sync_all(credential_store.get(key), key)
+
+def run(name: str, op, users: list, a) -> dict:
+    lat, errors, lock = [], [], threading.Lock()
+    deadline = time.perf_counter() + a.duration
+    def worker(_):
+        while time.perf_counter() < deadline:
+            u = random.choice(users)
+            t0 = time.perf_counter()
+            try: op(u); err = None
+            except Exception as e: err = e
+            dt = time.perf_counter() - t0
+            with lock: (errors if err else lat).append(err or dt)
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(a.concurrency) as pool: list(pool.map(worker, range(a.concurrency)))
+    wall = time.perf_counter() - t0
+    lat.sort()
+    return {"scenario": name, "ok": len(lat), "errors": len(errors), "rps": len(lat) / wall,
+            "p50_ms": _pct(lat, 50) * 1000, "p95_ms": _pct(lat, 95) * 1000, "p99_ms": _pct(lat, 99) * 1000,
+            "first_error": str(errors[0]) if errors else None}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scenarios", default=",".join(DEFAULT_SCENARIOS), help=f"any of {','.join(SCENARIOS)}")
+    ap.add_argument("--users", type=int, default=10)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--duration", type=float, default=5, help="seconds per scenario")
+    ap.add_argument("--seed", type=int, default=1000, help="events in the fake primary calendar")
+    ap.add_argument("--backlog", type=int, default=20, help="queued writes per retry_pending op")
+    ap.add_argument("--latency-ms", type=float, default=10)
+    ap.add_argument("--rate-limit", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--json", action="store_true", help="one JSON object per scenario instead of a table")
+    a = ap.parse_args()
+
+    webapp, base, cal, users = _setup(a)
+    ops = _ops(webapp, base, a)
+    _seed(users)
+    if not a.json:
+        print(f"{a.users} users, concurrency {a.concurrency}, {a.duration:g}s each, {a.seed} events, "
+              f"{a.latency_ms:g} ms upstream, {a.rate_limit:.0%} 429, {a.error_rate:.0%} 503")
+        print(f"{'scenario':<14}{'ok':>8}{'err':>6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name in a.scenarios.split(","):
+        r = run(name, ops[name], users, a)
+        if a.json: print(json.dumps(r)); continue
+        print(f"{name:<14}{r['ok']:>8}{r['errors']:>6}{r['rps']:>10.1f}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+              + (f"  first error: {r['first_error'][:60]}" if r["first_error"] else ""))
+    if not a.json: print(f"fake server: {cal.stats}")
+
+if __name__ == "__main__":
+    main()
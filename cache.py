@@ -0,0 +1,78 @@
+"""
+Server-side cache for fetched events and parsed trips.
+Backends: in-process LRU ("memory") or a shared SQLite file ("sqlite") so gunicorn workers see the same entries.
+"""
+import os, json, time, sqlite3, pathlib, threading
+from collections import OrderedDict
+
+DEFAULT_TTL = int(os.getenv("CACHE_TTL", "300"))
+MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1000"))
+
+class MemoryCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl: int = DEFAULT_TTL):
+        self.max_entries, self.ttl = max_entries, ttl
+        self._d: OrderedDict[str, tuple[float, object]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            hit = self._d.get(key)
+            if not hit: return default
+            if hit[0] < time.time():
+                del self._d[key]; return default
+            self._d.move_to_end(key)
+            return hit[1]
+
+    def set(self, key: str, value, ttl: int | None = None):
+        with self._lock:
+            self._d[key] = (time.time() + (ttl or self.ttl), value)
+            self._d.move_to_end(key)
+            while len(self._d) > self.max_entries: self._d.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock: self._d.pop(key, None)
+
+class SQLiteCache:
+    def __init__(self, path: str | pathlib.Path, max_entries: int = MAX_ENTRIES, ttl: int = DEFAULT_TTL):
+        self.path, self.max_entries, self.ttl = str(path), max_entries, ttl
+        self._local = threading.local()
+        db = sqlite3.connect(self.path, timeout=10)  # not kept: safe to create before gunicorn forks
+        db.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT, expires REAL, used REAL)")
+        db.execute("CREATE INDEX IF NOT EXISTS cache_used ON cache(used)")
+        db.commit(); db.close()
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL"); db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def get(self, key: str, default=None):
+        db, now = self._db(), time.time()
+        row = db.execute("SELECT value, expires FROM cache WHERE key=?", (key,)).fetchone()
+        if not row: return default
+        if row[1] < now:
+            db.execute("DELETE FROM cache WHERE key=?", (key,)); return default
+        db.execute("UPDATE cache SET used=? WHERE key=?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key: str, value, ttl: int | None = None):
+        db, now = self._db(), time.time()
+        db.execute("INSERT OR REPLACE INTO cache (key, value, expires, used) VALUES (?,?,?,?)",
+                   (key, json.dumps(value), now + (ttl or self.ttl), now))
+        db.execute("DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                   (self.max_entries,))
+
+    def delete(self, key: str):
+        self._db().execute("DELETE FROM cache WHERE key=?", (key,))
+
+def from_env():
+    backend = os.getenv("CACHE_BACKEND", "memory")
+    if backend == "sqlite":
+        data_dir = pathlib.Path(os.getenv("PERSIST_DIR", "scheduled_data")); data_dir.mkdir(parents=True, exist_ok=True)
+        return SQLiteCache(os.getenv("CACHE_PATH") or data_dir / "cache.sqlite3")
+    if backend == "memory":
+        return MemoryCache()
+    raise RuntimeError(f"Unknown CACHE_BACKEND: {backend}")
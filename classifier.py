@@ -0,0 +1,144 @@
+"""
+Line classifier for the text-entry flow (Events / Dates / Travel / Goals / Other).
+Results are memoized by line content, so a render only classifies new or edited lines
+and the sort keys come from the cache instead of being re-parsed.
+"""
+import os, re, time, hashlib, threading
+from collections import OrderedDict
+from datetime import datetime
+import geo_index
+import metrics
+
+CACHE_SIZE = int(os.getenv("CLASSIFY_CACHE_SIZE", "50000"))
+
+# --- Regex helpers ------------------------------------------------------------
+MONTHS = "Jan Feb Mar Apr May Jun Jul Aug Sep Oct Nov Dec".split()
+DATE_PREFIX_RE = re.compile(r"^\s*(?:(" + "|".join(MONTHS) + r")\.?)\s+(\d{1,2})\b", re.I)
+TIME_ANY_RE = re.compile(r"\b(\d{1,2})(?::(\d{2}))?\s*(AM|PM)\b", re.I)  # anywhere
+TIME_START_RE = re.compile(r"^\s*(\d{1,2})(?::(\d{2}))?\s*(AM|PM)\b", re.I)
+ISO_RE = re.compile(r"^\s*\d{4}-\d{2}-\d{2}(?:[T ][\d:.]+(?:Z|[+-]\d{2}:?\d{2})?)?\s*$")
+MONTH_NUM = {m.lower(): i for i, m in enumerate(MONTHS, 1)}
+GOAL_RE = re.compile(r"^\s*(Goal:|To\s)\b", re.I)
+TRAVEL_KEYWORDS = re.compile(r"\b(flight|fly|arrive|depart|airport|train|hotel|check-?in|to)\b", re.I)
+
+# --- Parse helpers ------------------------------------------------------------
+_free_form = None
+
+def _parse_date(text:str):
+    """Free-form fallback ("tomorrow 2pm"); dateparser is imported on first use only."""
+    global _free_form
+    if _free_form is None:
+        try:
+            # Preferred: dateparser (handles "tomorrow 2pm", etc.)
+            from dateparser import parse as _free_form
+        except Exception:
+            # Fallback: python-dateutil
+            from dateutil import parser as _du_parser
+            _free_form = _du_parser.parse
+    return _free_form(text)
+
+def _hm(m):
+    """(hour, minute) on the 24h clock; None for out-of-range text like "13 PM" or "9:75"."""
+    h = int(m.group(1)); minute = int(m.group(2) or 0); ampm = m.group(3).upper()
+    if not (1 <= h <= 12 and minute < 60): return None
+    h = 0 if h == 12 else h
+    if ampm == "PM": h += 12
+    return (h, minute)
+
+def parse_time_tuple(line:str):
+    m = TIME_START_RE.match(line)
+    if not m: m = TIME_ANY_RE.search(line)
+    if not m: return None
+    return _hm(m)
+
+def parse_date_prefix(line:str):
+    """`Mon DD` prefix -> datetime in the current year, built directly (no dateparser)."""
+    m = DATE_PREFIX_RE.match(line)
+    if not m: return None
+    try:
+        return datetime(datetime.now().year, MONTH_NUM[m.group(1).lower()], int(m.group(2)))
+    except ValueError:  # Feb 30 and friends
+        return None
+
+def parse_when(text:str, now:datetime | None = None):
+    """Fast paths for the app's own grammars (ISO, `Mon DD [H[:MM] AM/PM]`, `H[:MM] AM/PM`);
+    anything else goes to the lazily imported free-form parser."""
+    now = now or datetime.now()
+    if ISO_RE.match(text):
+        try: return datetime.fromisoformat(text.strip().replace("Z", "+00:00"))
+        except ValueError: pass
+    m = DATE_PREFIX_RE.match(text)
+    if m:
+        try: d = datetime(now.year, MONTH_NUM[m.group(1).lower()], int(m.group(2)))
+        except ValueError: return None
+        t = TIME_ANY_RE.search(text, m.end())
+        if not t: return d
+        hm = _hm(t)
+        return d.replace(hour=hm[0], minute=hm[1]) if hm else None
+    t = TIME_START_RE.match(text)
+    if t:
+        hm = _hm(t)
+        return now.replace(hour=hm[0], minute=hm[1], second=0, microsecond=0) if hm else None
+    try: return _parse_date(text)
+    except Exception: return None
+
+def schedule_when(line:str, now:datetime | None = None):
+    """Naive datetime for a schedule line: its clock time (anywhere on the line) on its `Mon DD`
+    prefix date, or on now's date without one. Regex only, never the free-form parser."""
+    now = now or datetime.now()
+    m = DATE_PREFIX_RE.match(line)
+    t = TIME_ANY_RE.search(line, m.end() if m else 0)
+    hm = _hm(t) if t else None
+    day = (parse_date_prefix(line) if m else now) if hm else None
+    return day.replace(hour=hm[0], minute=hm[1], second=0, microsecond=0) if day else None
+
+def is_goal(line:str) -> bool:
+    return bool(GOAL_RE.match(line))
+
+def is_travel(line:str) -> bool:
+    if not parse_date_prefix(line): return False
+    tail = DATE_PREFIX_RE.sub("", line).strip()
+    has_city_country = geo_index.names_place(tail)
+    has_keyword = bool(TRAVEL_KEYWORDS.search(tail))
+    return has_city_country or has_keyword
+
+# --- Memoized classification --------------------------------------------------
+_cache: OrderedDict[bytes, tuple] = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _classify_uncached(line:str) -> tuple:
+    """(kind, sort_key) with kind in goal/schedule/date/travel/other."""
+    if is_goal(line): return ("goal", None)
+    t = parse_time_tuple(line)
+    if t:  # by date, then time: time-only lines (today's) first, then dated ones (imports) in order
+        d = parse_date_prefix(line)
+        return ("schedule", (d.toordinal() if d else 0, *t))
+    d = parse_date_prefix(line)
+    if d: return ("travel" if is_travel(line) else "date", d)
+    return ("other", None)
+
+def classify_line(line:str) -> tuple:
+    # date prefixes resolve against the current year, so the year is part of the key
+    key = hashlib.blake2b(f"{datetime.now().year}\0{line}".encode(), digest_size=16).digest()
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit is not None:
+            _cache.move_to_end(key); metrics.CLASSIFY_LOOKUPS.inc(result="hit"); return hit
+    t0 = time.perf_counter()
+    rec = _classify_uncached(line)
+    metrics.CLASSIFY_LINE.observe(time.perf_counter() - t0); metrics.CLASSIFY_LOOKUPS.inc(result="miss")
+    with _cache_lock:
+        _cache[key] = rec
+        while len(_cache) > CACHE_SIZE: _cache.popitem(last=False)
+    return rec
+
+def classify(lines:list[str]):
+    schedule, dates, other, travel = [], [], [], []
+    buckets = {"goal": other, "schedule": schedule, "date": dates, "travel": travel, "other": other}
+    for ln in lines:
+        kind, key = classify_line(ln)
+        buckets[kind].append((key, ln))  # Goals live under Dates+Other per layout
+    schedule.sort(key=lambda x: x[0])
+    dates.sort(key=lambda x: x[0] or datetime.max)
+    travel.sort(key=lambda x: x[0] or datetime.max)
+    return [ln for _, ln in schedule], [ln for _, ln in dates], [ln for _, ln in other], [ln for _, ln in travel]
@@ -0,0 +1,83 @@
+"""
+Shared OAuth credentials per user: {user}_gcal_token.json on disk, parsed once into memory.
+Refreshes happen a few minutes before expiry and are single-flight: one thread (and one process,
+via flock) refreshes while the others wait and then reuse the new token.
+"""
+from __future__ import annotations
+import os, json, fcntl, pathlib, threading, datetime as dt
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
+
+DATA_DIR = pathlib.Path(os.getenv("PERSIST_DIR", "scheduled_data")); DATA_DIR.mkdir(parents=True, exist_ok=True)
+REFRESH_SKEW = float(os.getenv("TOKEN_REFRESH_SKEW", "300"))  # refresh this many seconds before expiry
+
+_creds: dict[str, tuple[int, Credentials]] = {}  # user -> (token file mtime_ns, parsed creds)
+_locks: dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+def token_path(user: str) -> pathlib.Path:
+    return DATA_DIR / f"{user}_gcal_token.json"
+
+def _lock_for(user: str) -> threading.Lock:
+    with _locks_guard: return _locks.setdefault(user, threading.Lock())
+
+@contextmanager
+def _refresh_lock(user: str):
+    with _lock_for(user), open(DATA_DIR / f"{user}_gcal_token.lock", "a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try: yield
+        finally: fcntl.flock(fh, fcntl.LOCK_UN)
+
+def _mtime(p: pathlib.Path) -> int | None:
+    try: return p.stat().st_mtime_ns
+    except FileNotFoundError: return None
+
+def _read(user: str) -> Credentials | None:
+    """Cached creds, re-parsed only when another process has rewritten the token file."""
+    p = token_path(user)
+    mtime = _mtime(p)
+    if mtime is None:
+        _creds.pop(user, None); return None
+    hit = _creds.get(user)
+    if hit and hit[0] == mtime: return hit[1]
+    from google.oauth2.credentials import Credentials
+    creds = Credentials.from_authorized_user_info(json.loads(p.read_text()))  # scopes come from the file
+    _creds[user] = (mtime, creds)
+    return creds
+
+def expires_within(creds: Credentials, seconds: float) -> bool:
+    if creds.expiry is None: return False
+    return creds.expiry - dt.datetime.utcnow() < dt.timedelta(seconds=seconds)
+
+def _stale(creds: Credentials, skew: float) -> bool:
+    return bool(creds.refresh_token) and (creds.expired or expires_within(creds, skew))
+
+def put(user: str, creds: Credentials):
+    p = token_path(user)
+    tmp = p.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "w") as fh:
+        fh.write(creds.to_json()); fh.flush(); os.fsync(fh.fileno())
+    os.replace(tmp, p)
+    _creds[user] = (_mtime(p), creds)
+
+def get(user: str, refresh_within: float = REFRESH_SKEW) -> Credentials | None:
+    creds = _read(user)
+    if creds is None or not _stale(creds, refresh_within): return creds
+    if not creds.expired and _lock_for(user).locked(): return creds  # refresh in flight; this one still works
+    with _refresh_lock(user):
+        creds = _read(user)  # whoever held the lock may have refreshed already
+        if creds is not None and _stale(creds, refresh_within):
+            from google.auth.transport.requests import Request
+            creds.refresh(Request())
+            put(user, creds)
+    return creds
+
+def stored(user: str) -> Credentials | None:
+    """The token on disk as it is, without refreshing it."""
+    return _read(user)
+
+def drop(user: str):
+    _creds.pop(user, None)
+    token_path(user).unlink(missing_ok=True)
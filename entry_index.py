@@ -0,0 +1,155 @@
+"""
+Persisted, pre-sorted index of a user's classified entries (<email>.index.json).
+Each line is stored with its category and sort key ([date ordinal or 0, hour, minute] / date
+ordinal); /add inserts by bisection, so rendering is a linear walk. The index records the .txt
+size and mtime and rebuilds itself when they no longer match (hand edits, reset, compaction), the
+year rolls over or the key layout (VERSION) changed.
+/add doesn't rewrite the index: it appends [stamp before, stamp after, line] to <email>.index.log,
+which is replayed on load and folded back into the index every LOG_COMPACT lines. Each process
+keeps its last parsed copy per user and reads only the new tail of the log.
+"""
+import os, json, bisect, pathlib, threading
+from collections import OrderedDict
+from datetime import datetime
+import classifier
+import user_store
+
+NO_DATE = 10**7  # sorts after every real date ordinal, like datetime.max did
+VERSION = 2  # sort key layout; an index written with another one is rebuilt
+LOG_COMPACT = int(os.getenv("ENTRY_LOG_COMPACT", "1000"))  # logged adds before the index is rewritten
+CACHE_SIZE = int(os.getenv("ENTRY_INDEX_CACHE_SIZE", "64"))  # users whose parsed index a process keeps
+
+_cache: OrderedDict[str, tuple] = OrderedDict()  # email -> (index file stamp, log bytes read, index)
+_cache_lock = threading.Lock()
+
+def index_file(email:str) -> pathlib.Path:
+    return user_store.DATA_DIR / f"{user_store._safe(email)}.index.json"
+
+def log_file(email:str) -> pathlib.Path:
+    return user_store.DATA_DIR / f"{user_store._safe(email)}.index.log"
+
+def _stamp(email:str) -> list:
+    p = user_store.user_file(email)
+    if not p.exists(): return [0, 0]
+    st = p.stat()
+    return [st.st_size, st.st_mtime_ns]
+
+def _file_stamp(p:pathlib.Path) -> tuple | None:
+    try: st = p.stat()
+    except FileNotFoundError: return None
+    return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+def _empty() -> dict:
+    return {"stamp": [0, 0], "year": datetime.now().year, "version": VERSION, "logged": 0, "schedule": [], "dates": [], "travel": [], "other": []}
+
+def _copy(idx:dict) -> dict:
+    """Cached indexes are shared with readers, so changes go to a copy of the lists."""
+    return {**idx, **{b: list(idx[b]) for b in ("schedule", "dates", "travel", "other")}}
+
+def _remember(email:str, base:tuple, pos:int, idx:dict):
+    with _cache_lock:
+        _cache[email] = (base, pos, idx); _cache.move_to_end(email)
+        while len(_cache) > CACHE_SIZE: _cache.popitem(last=False)
+
+def _insert(idx:dict, line:str, place=bisect.insort):
+    kind, key = classifier.classify_line(line)
+    if kind == "schedule":
+        place(idx["schedule"], [list(key), line], key=lambda r: r[0])
+    elif kind in ("date", "travel"):
+        bucket = idx["dates" if kind == "date" else "travel"]
+        place(bucket, [key.toordinal() if key else NO_DATE, line], key=lambda r: r[0])
+    else:
+        idx["other"].append(line)  # Goals live under Dates+Other per layout
+
+def _push(bucket:list, row:list, key): bucket.append(row)
+
+def _sort(idx:dict):
+    for b in ("schedule", "dates", "travel"): idx[b].sort(key=lambda r: r[0])  # stable: same order insort gives
+
+def rebuild(email:str) -> dict:
+    idx = _empty()
+    for ln in user_store._lines(user_store.user_file(email)): _insert(idx, ln)
+    idx["stamp"] = _stamp(email)
+    return idx
+
+def _save(email:str, idx:dict):
+    """Rewrite the index with everything logged folded in, then drop the log (caller holds the lock)."""
+    idx["logged"] = 0
+    user_store._atomic_write(index_file(email), json.dumps(idx))
+    log_file(email).unlink(missing_ok=True)
+    _remember(email, _file_stamp(index_file(email)), 0, idx)
+
+def _replay(idx:dict, data:bytes) -> tuple[dict, int]:
+    """Apply complete log records that continue from idx's stamp; returns (index, bytes consumed).
+    Records from before the last rewrite don't chain onto its stamp and are skipped."""
+    end = data.rfind(b"\n") + 1  # a record still being written is left for next time
+    records = [json.loads(raw) for raw in data[:end].splitlines()]
+    if records: idx = _copy(idx)
+    for prev, stamp, line in records:
+        if prev != idx["stamp"]: continue
+        _insert(idx, line); idx["stamp"] = stamp; idx["logged"] = idx.get("logged", 0) + 1
+    return idx, end
+
+def _load_valid(email:str) -> dict | None:
+    base = _file_stamp(index_file(email))
+    if base is None: return None
+    with _cache_lock: hit = _cache.get(email)
+    if hit and hit[0] == base: _, pos, idx = hit
+    else:
+        try: idx = json.loads(index_file(email).read_text(encoding="utf-8"))
+        except Exception: return None
+        pos = 0
+    try:
+        with open(log_file(email), "rb") as fh:
+            fh.seek(pos); tail = fh.read()
+    except FileNotFoundError: tail = b""
+    if tail or not (hit and hit[0] == base):
+        try: idx, used = _replay(idx, tail)
+        except (ValueError, TypeError): return None  # torn log: rebuild from the .txt
+        _remember(email, base, pos + used, idx)
+    if idx.get("stamp") != _stamp(email) or idx.get("year") != datetime.now().year or idx.get("version") != VERSION: return None
+    return idx
+
+def load(email:str) -> dict:
+    idx = _load_valid(email)
+    if idx is None:
+        with user_store.locked(email):
+            idx = _load_valid(email)
+            if idx is None: idx = rebuild(email); _save(email, idx)
+    return idx
+
+def add(email:str, text:str):
+    """Append a line and log its index insert under one lock: two small appends, no rewrite."""
+    with user_store.locked(email):
+        idx = _load_valid(email)
+        if idx is None:
+            idx = rebuild(email); _save(email, idx)
+        prev = idx["stamp"]
+        if not user_store._append(email, [text]): return
+        idx = _copy(idx)
+        _insert(idx, text.strip())
+        idx["stamp"] = _stamp(email); idx["logged"] = idx.get("logged", 0) + 1
+        if idx["logged"] >= LOG_COMPACT: _save(email, idx); return
+        with open(log_file(email), "ab") as fh:  # no fsync: a lost record just means a rebuild
+            fh.write(json.dumps([prev, idx["stamp"], text.strip()]).encode("utf-8") + b"\n")
+            pos = fh.tell()
+        _remember(email, _file_stamp(index_file(email)), pos, idx)
+
+def add_many(email:str, texts) -> int:
+    """Bulk add (imports): one lock, one append, lines classified chunk by chunk as they are
+    written and the index re-sorted once at the end instead of bisecting per line.
+    The input is streamed, but the whole index (a row per entry) is in memory until the final save."""
+    with user_store.locked(email):
+        idx = _copy(_load_valid(email) or rebuild(email))
+        n = user_store._append(email, texts, on_chunk=lambda lines: [_insert(idx, ln, _push) for ln in lines])
+        if not n: return 0
+        _sort(idx)
+        idx["stamp"] = _stamp(email)
+        _save(email, idx)
+    return n
+
+def classified(email:str):
+    """(schedule, dates, other, travel) lines, already in display order."""
+    idx = load(email)
+    return ([ln for _, ln in idx["schedule"]], [ln for _, ln in idx["dates"]],
+            list(idx["other"]), [ln for _, ln in idx["travel"]])
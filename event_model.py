@@ -0,0 +1,100 @@
+"""
+Compact in-memory event and trip records.
+Slotted dataclasses instead of per-event dicts: start/end are epoch seconds (plus the original UTC
+offset, so the ISO form can be rebuilt), calendar ids and statuses are interned, and JSON is
+produced once per record and joined into the response body rather than re-encoded per request.
+"""
+import os, sys, json
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+LOCAL_TZ = os.getenv("LOCAL_TZ", "Asia/Kolkata")  # zone text entries are written in and new events default to
+
+_TZ: dict[int, timezone] = {}
+
+def _tz(minutes: int) -> timezone:
+    tz = _TZ.get(minutes)
+    if tz is None: tz = _TZ[minutes] = timezone(timedelta(minutes=minutes))
+    return tz
+
+def parse_iso(iso: str | None) -> tuple[int | None, int | None]:
+    """ISO string -> (epoch seconds, UTC offset in minutes or None for floating/all-day times)."""
+    if not iso: return None, None
+    d = datetime.fromisoformat(iso.replace("Z", "+00:00"))
+    if d.tzinfo is None: return int(d.replace(tzinfo=timezone.utc).timestamp()), None
+    return int(d.timestamp()), int(d.utcoffset().total_seconds() // 60)
+
+def format_iso(ts: int | None, offset: int | None) -> str | None:
+    if ts is None: return None
+    if offset is None: return datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None).isoformat()
+    return datetime.fromtimestamp(ts, _tz(offset)).isoformat()
+
+def _intern(s: str | None) -> str | None:
+    return sys.intern(s) if s else s
+
+@dataclass(slots=True, eq=False)
+class Event:
+    id: str
+    summary: str
+    location: str | None
+    start_ts: int | None
+    end_ts: int | None
+    offset: int | None          # minutes east of UTC, None for all-day/floating
+    end_offset: int | None      # flights often end in another zone
+    status: str | None
+    html_link: str | None
+    calendar_id: str
+    rev: int = 0                # store revision that last changed it (event_store's "_rev")
+    _json: str | None = field(default=None, repr=False)
+
+    @classmethod
+    def from_normalized(cls, ev: dict, calendar_id: str) -> "Event":
+        """From an event_store.normalize() record."""
+        start, offset = parse_iso(ev.get("start"))
+        end, end_offset = parse_iso(ev.get("end"))
+        return cls(ev.get("id"), ev.get("summary"), ev.get("location"), start, end, offset, end_offset,
+                   _intern(ev.get("status")), ev.get("htmlLink"), _intern(calendar_id), ev.get("_rev", 0))
+
+    @property
+    def start(self) -> str | None: return format_iso(self.start_ts, self.offset)
+
+    @property
+    def end(self) -> str | None: return format_iso(self.end_ts, self.end_offset)
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "summary": self.summary, "location": self.location, "start": self.start,
+                "end": self.end, "status": self.status, "htmlLink": self.html_link, "calendarId": self.calendar_id}
+
+    # dict-style access for templates and callers written against the old per-event dicts
+    def __getitem__(self, key: str): return self.to_dict()[key]
+    def get(self, key: str, default=None): return self.to_dict().get(key, default)
+
+    @property
+    def json(self) -> str:
+        if self._json is None: self._json = json.dumps(self.to_dict(), separators=(",", ":"))
+        return self._json
+
+@dataclass(slots=True, eq=False)
+class Trip:
+    type: str
+    title: str | None
+    start: str | None
+    end: str | None
+    city: str | None
+    airport: str | None
+    flight_number: str | None
+
+    def to_dict(self) -> dict:
+        return {"type": self.type, "title": self.title, "start": self.start, "end": self.end,
+                "city": self.city, "airport": self.airport, "flight_number": self.flight_number}
+
+    def __getitem__(self, key: str): return getattr(self, key)
+    def get(self, key: str, default=None): return getattr(self, key, default)
+
+    @property
+    def json(self) -> str:
+        return json.dumps(self.to_dict(), separators=(",", ":"))
+
+def dumps(records) -> str:
+    """JSON array of records, from each record's (cached) JSON text."""
+    return "[" + ",".join(r.json for r in records) + "]"
@@ -0,0 +1,351 @@
+"""
+Local per-user Google Calendar event store.
+Seeded once with a full list, then kept current with syncToken deltas.
+Reads share one read view per file version (keyed by mtime/inode/size) and must not mutate it:
+each calendar's events are slotted event_model.Event records sorted by start, not the raw
+per-event dicts, so the cache costs a fraction of the JSON's memory and an Event's serialized
+form is reused until the file changes. Writers re-read the raw file under a thread lock plus an
+flock, since web workers and the sync process all write the same file.
+"""
+import os, re, json, fcntl, heapq, queue, pathlib, threading, time, datetime as dt
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timezone
+import gapi
+from event_model import Event
+
+DATA_DIR = pathlib.Path(os.getenv("PERSIST_DIR", "scheduled_data")); DATA_DIR.mkdir(parents=True, exist_ok=True)
+LOOKBACK_DAYS = int(os.getenv("SYNC_LOOKBACK_DAYS", "30"))
+PAGE_SIZE = 2500  # Calendar API max for events.list
+CALENDARS = os.getenv("GCAL_CALENDARS", "primary")  # comma-separated ids, or "all" for every selected calendar
+FANOUT_WORKERS = int(os.getenv("GCAL_FANOUT_WORKERS", "8"))
+STREAM_WORKERS = int(os.getenv("GCAL_STREAM_WORKERS", "32"))  # calendar pumps across all open streams
+TOMBSTONES = 5000  # removals remembered for ?since= deltas; older clients get a full list
+CACHE_SIZE = int(os.getenv("EVENT_CACHE_SIZE", "256"))  # parsed stores kept in memory per process
+
+_locks: dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+_cache: OrderedDict[str, tuple[tuple, dict]] = OrderedDict()  # user -> (file stamp, read view)
+_cache_lock = threading.Lock()
+_pools: dict[str, tuple[int, ThreadPoolExecutor]] = {}
+_pools_guard = threading.Lock()
+
+def _safe(user: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_-]+", "_", user.replace("@", "_at_"))
+
+def _path(user: str) -> pathlib.Path:
+    return DATA_DIR / f"{_safe(user)}_gcal_events.json"
+
+def _thread_lock(user: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(user, threading.Lock())
+
+@contextmanager
+def _lock(user: str):
+    """Exclusive across threads and processes for one user's read-modify-write."""
+    with _thread_lock(user), open(DATA_DIR / f"{_safe(user)}_gcal_events.lock", "a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try: yield
+        finally: fcntl.flock(fh, fcntl.LOCK_UN)
+
+def _stamp(p: pathlib.Path) -> tuple | None:
+    try: st = p.stat()
+    except FileNotFoundError: return None
+    return st.st_mtime_ns, st.st_ino, st.st_size  # os.replace gives every write a new inode
+
+def _parse(p: pathlib.Path) -> dict:
+    try: return json.loads(p.read_text())
+    except Exception: return {"calendars": {}}
+
+def _start_order(ev: Event) -> float:
+    return float("inf") if ev.start_ts is None else ev.start_ts
+
+def _view(data: dict) -> dict:
+    """The store with each calendar's {id: event dict} replaced by Event records sorted by start."""
+    cals = {}
+    for cid, cal in data.get("calendars", {}).items():
+        evs = [Event.from_normalized(ev, cid) for ev in cal.get("events", {}).values()]
+        evs.sort(key=_start_order)
+        cals[cid] = {**cal, "events": evs}
+    return {**data, "calendars": cals}
+
+def _remember(user: str, stamp: tuple, view: dict):
+    with _cache_lock:
+        _cache[user] = (stamp, view); _cache.move_to_end(user)
+        while len(_cache) > CACHE_SIZE: _cache.popitem(last=False)
+
+def load(user: str) -> dict:
+    """The user's store as a read view (see the module docstring), parsed only when the file
+    changed since this process last read it. Shared between callers: treat it as read-only."""
+    p = _path(user)
+    stamp = _stamp(p)
+    if stamp is None: return {"calendars": {}}
+    with _cache_lock:
+        hit = _cache.get(user)
+        if hit and hit[0] == stamp: _cache.move_to_end(user); return hit[1]
+    view = _view(_parse(p))
+    _remember(user, stamp, view)
+    return view
+
+def _load_for_write(user: str) -> dict:
+    """A private, current copy to modify; call under _lock(user)."""
+    p = _path(user)
+    return _parse(p) if p.exists() else {"calendars": {}}
+
+def _save(user: str, data: dict):
+    p = _path(user); tmp = p.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_text(json.dumps(data))
+    os.replace(tmp, p)
+    _remember(user, _stamp(p), _view(data))
+
+def executor(name: str = "fanout", workers: int = FANOUT_WORKERS) -> ThreadPoolExecutor:
+    """Process-wide pool for per-calendar Google calls. Long-lived so its threads keep their
+    service_pool services (and TLS connections) between calls; rebuilt after a fork."""
+    with _pools_guard:
+        hit = _pools.get(name)
+        if hit is None or hit[0] != os.getpid():
+            hit = _pools[name] = (os.getpid(), ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"gcal-{name}"))
+        return hit[1]
+
+def gather(futures: dict) -> tuple[dict, dict]:
+    """({key: result}, {key: exception}) for {key: future}: one failing calendar doesn't sink the rest."""
+    done, errors = {}, {}
+    for key, fut in futures.items():
+        try: done[key] = fut.result()
+        except Exception as e: errors[key] = e
+    return done, errors
+
+# ===== Normalization =====
+def normalize(ev: dict) -> dict:
+    s = ev.get("start", {}); e = ev.get("end", {})
+    return {
+        "id": ev.get("id"),
+        "summary": ev.get("summary", "(No title)"),
+        "location": ev.get("location"),
+        "start": s.get("dateTime") or (s.get("date")+"T00:00:00" if s.get("date") else None),
+        "end": e.get("dateTime") or (e.get("date")+"T00:00:00" if e.get("date") else None),
+        "status": ev.get("status"),
+        "htmlLink": ev.get("htmlLink"),
+    }
+
+def _ts(iso: str | None) -> float:
+    if not iso: return float("inf")
+    d = dt.datetime.fromisoformat(iso.replace("Z", "+00:00"))
+    if d.tzinfo is None: d = d.replace(tzinfo=timezone.utc)
+    return d.timestamp()
+
+# ===== Sync =====
+def _pages(service, page_size: int = PAGE_SIZE, **params):
+    """Yield every page of events.list, following nextPageToken."""
+    token = None
+    while True:
+        resp = gapi.execute(service.events().list(pageToken=token, maxResults=page_size, singleEvents=True, **params))
+        yield resp
+        token = resp.get("nextPageToken")
+        if not token: return
+
+def _full(service, calendar_id: str) -> dict:
+    time_min = (dt.datetime.now(timezone.utc) - dt.timedelta(days=LOOKBACK_DAYS)).isoformat()
+    events, sync_token = {}, None
+    for page in _pages(service, calendarId=calendar_id, timeMin=time_min):
+        for ev in page.get("items", []):
+            if ev.get("status") != "cancelled": events[ev["id"]] = normalize(ev)
+        sync_token = page.get("nextSyncToken") or sync_token
+    return {"sync_token": sync_token, "events": events, "time_min": time_min}
+
+def _delta(service, calendar_id: str, sync_token: str) -> tuple[list, str]:
+    """(changed items, next sync token) since sync_token."""
+    items = []
+    for page in _pages(service, calendarId=calendar_id, syncToken=sync_token):
+        items += page.get("items", [])
+        sync_token = page.get("nextSyncToken") or sync_token
+    return items, sync_token
+
+def _apply(cal: dict, items: list, sync_token: str) -> tuple[dict, set]:
+    """A copy of cal with delta items applied; returns it with the touched ids."""
+    cal = {**cal, "events": dict(cal.get("events", {})), "sync_token": sync_token}
+    for ev in items:
+        if ev.get("status") == "cancelled": cal["events"].pop(ev["id"], None)
+        else: cal["events"][ev["id"]] = normalize(ev)
+    return cal, {ev["id"] for ev in items}
+
+def _fetch(service, calendar_id: str, sync_token: str | None) -> tuple[str, object, str | None]:
+    """Pull one calendar's changes without holding the user lock:
+    ("delta", items, next token), or ("full", calendar, None) when there is no token or it expired."""
+    try:
+        if sync_token: return ("delta", *_delta(service, calendar_id, sync_token))
+    except Exception as e:  # googleapiclient HttpError; not imported to keep startup light
+        if getattr(getattr(e, "resp", None), "status", None) != 410: raise
+    return "full", _full(service, calendar_id), None
+
+def _stamp_revision(data: dict, calendar_id: str, cal: dict, touched: set | None) -> int:
+    """Give changed events the next store revision and record removals; returns the change count."""
+    old = data["calendars"].get(calendar_id, {}).get("events", {})
+    new = cal["events"]
+    ids = touched if touched is not None else set(old) | set(new)
+    changed = [i for i in ids if i in new and {**new[i], "_rev": 0} != {**old.get(i, {}), "_rev": 0}]
+    removed = [i for i in ids if i in old and i not in new]
+    for i in new:  # carry revisions over for untouched events
+        if i in old and "_rev" in old[i]: new[i].setdefault("_rev", old[i]["_rev"])
+    if not changed and not removed: return 0
+    rev = data["rev"] = data.get("rev", 0) + 1
+    for i in changed: new[i]["_rev"] = rev
+    tomb = data.setdefault("removed", [])
+    tomb += [[rev, calendar_id, i] for i in removed]
+    if len(tomb) > TOMBSTONES:
+        data["horizon"] = tomb[-TOMBSTONES - 1][0]; del tomb[:-TOMBSTONES]
+    return len(changed) + len(removed)
+
+def sync(service, user: str, calendar_id: str = "primary") -> dict:
+    """Bring the local copy of one calendar up to date. Falls back to a full resync on 410 Gone.
+    A delta is applied to the calendar as re-read under the lock, so concurrent syncs don't lose updates."""
+    mode, got, token = _fetch(service, calendar_id, load(user)["calendars"].get(calendar_id, {}).get("sync_token"))
+    with _lock(user):
+        data = _load_for_write(user)
+        if mode == "delta": cal, touched = _apply(data["calendars"].get(calendar_id, {}), got, token)
+        else: cal, touched = got, None
+        cal["synced_at"] = time.time()
+        changed = _stamp_revision(data, calendar_id, cal, touched)
+        data["calendars"][calendar_id] = cal
+        _save(user, data)
+    return {"ok": True, "mode": mode, "changed": changed, "total": len(cal["events"]), "rev": data.get("rev", 0)}
+
+def calendar_ids(service, spec: str = CALENDARS) -> list[str]:
+    if spec != "all": return [c.strip() for c in spec.split(",") if c.strip()]
+    ids, token = [], None
+    while True:
+        resp = gapi.execute(service.calendarList().list(pageToken=token, minAccessRole="reader"))
+        ids += [c["id"] for c in resp.get("items", []) if c.get("selected") or c.get("primary")]
+        token = resp.get("nextPageToken")
+        if not token: return ids
+
+def sync_all(creds, user: str, spec: str = CALENDARS) -> dict:
+    """Sync every configured calendar concurrently; wall time tracks the slowest calendar, not the sum.
+    A calendar that fails is reported in its slot; only when all of them fail does this raise."""
+    from service_pool import get_service  # one service per pool thread; httplib2 is not thread-safe
+    ids = calendar_ids(get_service(creds), spec)
+    results, errors = gather({cid: executor().submit(lambda c: sync(get_service(creds), user, c), cid) for cid in ids})
+    if errors and not results: raise next(iter(errors.values()))
+    results.update({cid: {"ok": False, "error": str(e)} for cid, e in errors.items()})
+    with _lock(user):
+        data = _load_for_write(user)
+        if data.get("selected") != ids or set(data["calendars"]) - set(ids):
+            data["selected"] = ids  # calendars came or went: deltas can't express that, force a full list
+            data["rev"] = data["horizon"] = data.get("rev", 0) + 1
+            data["calendars"] = {cid: cal for cid, cal in data["calendars"].items() if cid in ids}
+            _save(user, data)
+    return {"ok": not errors, "calendars": results}
+
+def complete_from(data: dict) -> dt.datetime | None:
+    """Earliest start the store holds every event from: the latest full list's timeMin over the
+    selected calendars (deltas keep it complete from there on). None before the first sync."""
+    cals = [data["calendars"].get(cid) for cid in data.get("selected") or ["primary"]]
+    if not all(cals): return None
+    fallback = (dt.datetime.now(timezone.utc) - dt.timedelta(days=LOOKBACK_DAYS)).isoformat()  # stores from before time_min
+    return max(dt.datetime.fromisoformat(c.get("time_min") or fallback) for c in cals)
+
+def revision(user: str) -> int:
+    return load(user).get("rev", 0)
+
+def seeded(user: str) -> bool:
+    return bool(load(user)["calendars"])
+
+def is_stale(user: str, max_age: float) -> bool:
+    """True when any selected calendar is missing or older than max_age seconds."""
+    data = load(user)
+    cals = [data["calendars"].get(cid) or {} for cid in data.get("selected") or list(data["calendars"]) or ["primary"]]
+    return time.time() - min(c.get("synced_at", 0) for c in cals) > max_age
+
+# ===== Streaming =====
+STREAM_PAGE_SIZE = 250  # small first page so the client paints quickly
+STREAM_TIMEOUT = float(os.getenv("GCAL_STREAM_TIMEOUT", "60"))  # longest wait for the next page before giving up
+_DONE = object()
+
+def stream(creds, time_min: str, time_max: str, spec: str = CALENDARS, max_pages: int = 4):
+    """An iterator of normalized events straight from Google while later pages are still in flight.
+    Calendars are fetched concurrently; at most max_pages pages are buffered, so memory stays
+    flat for year-long ranges. Order is by start within a calendar, arrival order across them.
+    Calendar ids are resolved here, before any response is sent, so auth errors raise; later
+    failures arrive as {"error": ...} records."""
+    from service_pool import get_service
+    return _stream(creds, calendar_ids(get_service(creds), spec), time_min, time_max, max_pages)
+
+def _stream(creds, ids: list[str], time_min: str, time_max: str, max_pages: int):
+    from service_pool import get_service
+    q, stop = queue.Queue(maxsize=max_pages), threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try: q.put(item, timeout=0.5); return
+            except queue.Full: continue
+
+    def pump(cid):
+        try:
+            for page in _pages(get_service(creds), STREAM_PAGE_SIZE, calendarId=cid, timeMin=time_min,
+                               timeMax=time_max, orderBy="startTime"):
+                if stop.is_set(): return
+                put((cid, page.get("items", [])))
+        except Exception as e:
+            put((cid, e))
+        finally:
+            put((cid, _DONE))
+
+    pool = executor("stream", STREAM_WORKERS)  # its own pool: a slow client parks pumps here, not in front of syncs
+    for cid in ids: pool.submit(pump, cid)
+    try:
+        pending = len(ids)
+        while pending:
+            try: cid, items = q.get(timeout=STREAM_TIMEOUT)
+            except queue.Empty:
+                yield {"error": f"no page from Google in {STREAM_TIMEOUT:g} s"}; return
+            if items is _DONE: pending -= 1
+            elif isinstance(items, Exception): yield {"calendarId": cid, "error": str(items)}
+            else:
+                for ev in items:
+                    if ev.get("status") != "cancelled": yield dict(normalize(ev), calendarId=cid)
+    finally:  # client went away or we finished: release the producers
+        stop.set()
+
+# ===== Reads =====
+def _overlaps(ev: Event, lo: float, hi: float) -> bool:
+    if ev.start_ts is None: return False
+    return ev.start_ts < hi and (ev.start_ts if ev.end_ts is None else ev.end_ts) > lo
+
+def _window(cal: dict, lo: float, hi: float) -> list[Event]:
+    """The view's own records (already sorted by start), so their cached JSON is reused."""
+    return [ev for ev in cal["events"] if _overlaps(ev, lo, hi)]
+
+def events(user: str, time_min: str | None = None, time_max: str | None = None, calendar_ids: list[str] | None = None) -> list[Event]:
+    """Locally stored events overlapping [time_min, time_max) across calendars, k-way merged by start."""
+    data = load(user)
+    ids = calendar_ids or data.get("selected") or ["primary"]
+    lo = _ts(time_min) if time_min else float("-inf")
+    hi = _ts(time_max) if time_max else float("inf")
+    runs = [_window(data["calendars"][cid], lo, hi) for cid in ids if cid in data["calendars"]]
+    return list(heapq.merge(*runs, key=lambda ev: ev.start_ts))
+
+def changes_since(user: str, since: int, window: tuple | None = None, prev_window: tuple | None = None) -> dict:
+    """Events (Event records) changed and ids removed after revision `since`; full=True when
+    tombstones no longer reach back.
+    With window=(lo, hi) in epoch seconds the delta is for a client holding prev_window's events:
+    changed events outside the window and events the window slid off come back as removed, and
+    events it slid onto come back as changed even though their revision is old."""
+    data = load(user)
+    ids = data.get("selected") or ["primary"]
+    if since < data.get("horizon", 0):
+        return {"rev": data.get("rev", 0), "full": True}
+    removed = [{"id": i, "calendarId": cid} for rev, cid, i in data.get("removed", []) if rev > since]
+    changed = []
+    lo, hi = window or (None, None)
+    plo, phi = prev_window or (lo, hi)
+    for cid in ids:
+        for ev in data["calendars"].get(cid, {}).get("events", ()):
+            fresh = ev.rev > since
+            if window is None:
+                if fresh: changed.append(ev)
+                continue
+            inside, was = _overlaps(ev, lo, hi), _overlaps(ev, plo, phi)
+            if inside and (fresh or not was): changed.append(ev)
+            elif not inside and (fresh or was): removed.append({"id": ev.id, "calendarId": cid})
+    return {"rev": data.get("rev", 0), "full": False, "changed": changed, "removed": removed}
@@ -0,0 +1,143 @@
+"""
+Single entry point for Google API calls: execute(request) instead of request.execute().
+Every call takes a token from its user's bucket and from the project-wide bucket, retries
+429 / 403 rateLimitExceeded / 5xx / connection errors with capped exponential backoff and
+jitter, and fails fast while the circuit breaker is open because Google keeps erroring.
+"""
+import os, time, random, threading
+import metrics
+
+USER_QPS = float(os.getenv("GAPI_USER_QPS", "10"))
+USER_BURST = float(os.getenv("GAPI_USER_BURST", "20"))
+PROJECT_QPS = float(os.getenv("GAPI_PROJECT_QPS", "100"))  # per process: divide the project quota by worker count
+PROJECT_BURST = float(os.getenv("GAPI_PROJECT_BURST", "200"))
+MAX_RETRIES = int(os.getenv("GAPI_MAX_RETRIES", "4"))
+BACKOFF_BASE = float(os.getenv("GAPI_BACKOFF_BASE", "0.5"))
+BACKOFF_CAP = float(os.getenv("GAPI_BACKOFF_CAP", "16"))
+BREAKER_THRESHOLD = int(os.getenv("GAPI_BREAKER_THRESHOLD", "10"))  # consecutive 5xx/network failures
+BREAKER_COOLDOWN = float(os.getenv("GAPI_BREAKER_COOLDOWN", "30"))
+
+class CircuitOpen(RuntimeError):
+    """Google looks degraded; calls are refused until the cooldown passes."""
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate, self.burst = rate, burst
+        self.tokens, self.updated = burst, time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self, cost: float = 1) -> float:
+        """Spend cost tokens; returns how long the caller must wait first. Large costs (a batch)
+        may drive the balance negative, which simply delays the next callers."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= cost
+            return max(0.0, -self.tokens) / self.rate
+
+class CircuitBreaker:
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+        self.threshold, self.cooldown = threshold, cooldown
+        self.failures, self.opened_at = 0, None
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.opened_at is None: return True
+            if time.monotonic() - self.opened_at >= self.cooldown:  # half-open: let calls probe
+                self.opened_at, self.failures = None, self.threshold - 1
+                return True
+            return False
+
+    def record(self, ok: bool):
+        with self.lock:
+            if ok: self.failures = 0; return
+            self.failures += 1
+            if self.failures >= self.threshold and self.opened_at is None: self.opened_at = time.monotonic()
+
+    @property
+    def open(self) -> bool:
+        return self.opened_at is not None
+
+project = TokenBucket(PROJECT_QPS, PROJECT_BURST)
+breaker = CircuitBreaker()
+_users: dict[str, TokenBucket] = {}
+_users_guard = threading.Lock()
+metrics.Gauge("gapi_breaker_open", "1 while the Google API circuit breaker is open.", lambda: int(breaker.open))
+
+def _count(**kw):
+    for event, n in kw.items(): metrics.GAPI_EVENTS.inc(n, event=event)
+
+def stats() -> dict:
+    return dict({k[0]: v for k, v in list(metrics.GAPI_EVENTS.values.items())}, breaker_open=breaker.open)
+
+# ===== Error classification (HttpError is duck-typed so googleapiclient stays a lazy import) =====
+def status(exc) -> int | None:
+    return getattr(getattr(exc, "resp", None), "status", None)
+
+def rate_limited(exc) -> bool:
+    s = status(exc)
+    if s == 429: return True
+    return s == 403 and b"ateLimitExceeded" in (getattr(exc, "content", None) or b"")
+
+def _degraded(exc) -> bool:
+    s = status(exc)
+    if s is not None: return s >= 500
+    return isinstance(exc, (ConnectionError, TimeoutError, OSError))
+
+def retryable(exc) -> bool:
+    """What execute() itself would retry; for callers passing retries=0 and retrying on their own."""
+    return rate_limited(exc) or _degraded(exc)
+
+def _key(http) -> str | None:
+    creds = getattr(http, "credentials", None)
+    if creds is None: return None
+    from service_pool import identity
+    return identity(creds)
+
+def key_for(service) -> str | None:
+    """Bucket key for a pooled service: the identity of the credentials it carries."""
+    return _key(getattr(service, "_http", None))
+
+def _bucket(key: str | None) -> TokenBucket | None:
+    if key is None: return None
+    with _users_guard:
+        b = _users.get(key)
+        if b is None: b = _users[key] = TokenBucket(USER_QPS, USER_BURST)
+        return b
+
+def _throttle(key: str | None, cost: float, sleep):
+    b = _bucket(key)
+    wait = max(project.take(cost), b.take(cost) if b else 0.0)
+    if wait:
+        _count(throttled_waits=1); sleep(wait)
+
+# ===== Calls =====
+def execute(request, key: str | None = None, cost: float = 1, sleep=time.sleep, retries: int = MAX_RETRIES):
+    """request.execute() with rate limiting, retries and the circuit breaker.
+    key defaults to the identity of the request's credentials; batches pass key_for(svc) and cost=len.
+    retries=0 leaves retrying to the caller (flush_batched re-sends only the failed part of a batch)."""
+    key = key or _key(getattr(request, "http", None))
+    method = getattr(request, "methodId", None) or "batch"
+    for attempt in range(retries + 1):
+        if not breaker.allow():
+            _count(circuit_rejected=1)
+            raise CircuitOpen("Google API calls paused after repeated failures")
+        _throttle(key, cost, sleep)
+        _count(calls=1)
+        t0 = time.perf_counter()
+        try:
+            resp = request.execute()
+        except Exception as e:
+            metrics.GAPI_LATENCY.observe(time.perf_counter() - t0, method=method, outcome=str(status(e) or "error"))
+            limited, degraded = rate_limited(e), _degraded(e)
+            breaker.record(not degraded)
+            if not (limited or degraded) or attempt == retries:
+                _count(errors=1); raise
+            _count(retries=1, **({"rate_limited": 1} if limited else {"server_errors": 1}))
+            sleep(min(BACKOFF_CAP, BACKOFF_BASE * 2**attempt) * random.uniform(0.5, 1.5))
+            continue
+        metrics.GAPI_LATENCY.observe(time.perf_counter() - t0, method=method, outcome="ok")
+        breaker.record(True)
+        return resp
@@ -0,0 +1,63 @@
+"""
+Precomputed place index for the travel classifier.
+Built once from geotext's city/country tables and every pycountry country field, written to
+data/geo_index.json, then loaded lazily into frozensets so a lookup is a couple of set probes.
+
+    python geo_index.py      # prebuild (e.g. in the Render build command)
+"""
+import os, re, json, pathlib, threading
+
+INDEX_PATH = pathlib.Path(os.getenv("GEO_INDEX_PATH", pathlib.Path(__file__).parent / "data" / "geo_index.json"))
+ALIASES = {"US":"UNITED STATES", "USA":"UNITED STATES", "UAE":"UNITED ARAB EMIRATES", "UK":"UNITED KINGDOM"}
+# same candidate pattern GeoText uses: capitalised words, optionally joined ("New York", "Rio de Janeiro")
+CANDIDATE_RE = re.compile(r"[A-ZÀ-Ú]+[a-zà-ú]+[ \-]?(?:d[a-u].)?(?:[A-ZÀ-Ú]+[a-zà-ú]+)*")
+
+_places: frozenset[str] | None = None     # geotext cities + countries, lowercased
+_countries: frozenset[str] | None = None  # every pycountry field value, lowercased
+_lock = threading.Lock()
+
+def _versions() -> dict:
+    from importlib.metadata import version, PackageNotFoundError
+    out = {}
+    for pkg in ("geotext", "pycountry"):
+        try: out[pkg] = version(pkg)
+        except PackageNotFoundError: out[pkg] = None
+    return out
+
+def build() -> dict:
+    from geotext import GeoText
+    import pycountry
+    places = set(GeoText.index.cities) | set(GeoText.index.countries)
+    countries = {str(v).lower() for c in pycountry.countries for v in c._fields.values() if v is not None}
+    data = {"versions": _versions(), "places": sorted(places), "countries": sorted(countries)}
+    tmp = INDEX_PATH.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, INDEX_PATH)
+    return data
+
+def _load():
+    global _places, _countries
+    with _lock:
+        if _places is not None: return
+        data = None
+        if INDEX_PATH.exists():
+            data = json.loads(INDEX_PATH.read_text(encoding="utf-8"))
+            if data.get("versions") != _versions(): data = None  # libraries upgraded: rebuild
+        data = data or build()
+        _countries = frozenset(data["countries"])
+        _places = frozenset(data["places"])
+
+def is_country_token(word:str) -> bool:
+    if _countries is None: _load()
+    w = word.upper().strip(".,;:!?")
+    return ALIASES.get(w, w).lower() in _countries
+
+def names_place(text:str) -> bool:
+    """True if text mentions a city or country (GeoText rules) or a token is a country name/code."""
+    if _places is None: _load()
+    if any(c.strip().lower() in _places for c in CANDIDATE_RE.findall(text)): return True
+    return any(is_country_token(tok) for tok in text.split())
+
+if __name__ == "__main__":
+    d = build()
+    print(f"wrote {INDEX_PATH}: {len(d['places']):,} places, {len(d['countries']):,} country keys")
@@ -1,39 +1,57 @@
-import os, json, pathlib, datetime as dt, uuid
-from flask import session
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
-from google.auth.transport.requests import Request
+from __future__ import annotations
+import os, heapq, itertools, pathlib, datetime as dt, time, random
+from typing import TYPE_CHECKING
+from flask import session, has_request_context
+from service_pool import get_service
+import credential_store
+import gapi
+import pending_queue
+import event_store
+from event_model import LOCAL_TZ
+if TYPE_CHECKING:  # google-auth/oauthlib are imported on first use, not at app startup
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import Flow
 
 CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
 SCOPES = os.getenv("GOOGLE_SCOPES","https://www.googleapis.com/auth/calendar.events").split()
 REDIRECT_URI = os.getenv("GOOGLE_REDIRECT_URI") or os.getenv("OAUTH_REDIRECT_URI")
 DATA_DIR = pathlib.Path(os.getenv("PERSIST_DIR", "scheduled_data")); DATA_DIR.mkdir(parents=True, exist_ok=True)
+WRITE_SCOPES = {"https://www.googleapis.com/auth/calendar", "https://www.googleapis.com/auth/calendar.events"}
+BATCH_SIZE = 50  # Calendar API batch limit
+BATCH_MAX_ROUNDS = int(os.getenv("BATCH_MAX_ROUNDS", "5"))
+BATCH_BACKOFF_BASE = float(os.getenv("BATCH_BACKOFF_BASE", "1.0"))
 
 def _safe_email() -> str:
-    email = session.get("email") or "anon@example.com"
+    email = (session.get("email") if has_request_context() else None) or "anon@example.com"
     return email.replace("@","_at_").replace(".","_")
 
-def _token_path() -> pathlib.Path:
-    return DATA_DIR / f"{_safe_email()}_gcal_token.json"
+def _token_path(user: str | None = None) -> pathlib.Path:
+    return credential_store.token_path(user or _safe_email())
 
-def _pending_path() -> pathlib.Path:
-    return DATA_DIR / f"{_safe_email()}_gcal_pending.json"
+def _pending_path(user: str | None = None) -> pathlib.Path:
+    return DATA_DIR / f"{user or _safe_email()}_gcal_pending.json"
 
-def save_creds(creds: Credentials):
-    _token_path().write_text(creds.to_json())
+def known_users() -> list[str]:
+    """Signed-in users with a stored token, for the background sync worker. Tokens an older
+    version kept under a per-session id (no "_at_") are nobody's and are skipped."""
+    users = (p.name[:-len("_gcal_token.json")] for p in DATA_DIR.glob("*_gcal_token.json"))
+    return sorted(u for u in users if "_at_" in u)
 
-def load_creds() -> Credentials | None:
-    p = _token_path()
-    if not p.exists(): return None
-    info = json.loads(p.read_text())
-    creds = Credentials.from_authorized_user_info(info, SCOPES)
-    if creds and creds.expired and creds.refresh_token:
-        creds.refresh(Request()); save_creds(creds)
-    return creds
+def save_creds(creds: Credentials, user: str | None = None) -> bool:
+    """Store creds as the user's token, unless they can't write and the stored one can: the web
+    sign-in and start_flow() share <user>_gcal_token.json, and create_event_safe / retry_pending need writes."""
+    user = user or _safe_email()
+    if not can_write(creds) and can_write(credential_store.stored(user)): return False
+    credential_store.put(user, creds)
+    return True
+
+def load_creds(user: str | None = None, refresh_within: float = credential_store.REFRESH_SKEW) -> Credentials | None:
+    """Shared in-memory creds; refreshed once per user shortly before expiry."""
+    return credential_store.get(user or _safe_email(), refresh_within)
 
 def start_flow(state: str | None = None) -> Flow:
+    from google_auth_oauthlib.flow import Flow
     flow = Flow.from_client_config(
         {"web":{"client_id":CLIENT_ID,"client_secret":CLIENT_SECRET,
                 "auth_uri":"https://accounts.google.com/o/oauth2/auth",
@@ -45,56 +63,141 @@ def start_flow(state: str | None = None) -> Flow:
     return flow
 
 def build_service(creds: Credentials):
-    return build("calendar","v3",credentials=creds,cache_discovery=False)
+    return get_service(creds)
+
+def can_write(creds: Credentials | None) -> bool:
+    """Whether creds were granted a scope that can insert events."""
+    return bool(creds) and bool(WRITE_SCOPES & set(creds.scopes or ()))
 
-def ensure_authed():
-    creds = load_creds()
+def ensure_authed(user: str | None = None):
+    creds = load_creds(user)
     if not creds: return False, None
     try: return True, build_service(creds)
     except Exception: return False, None
 
+def _start_key(ev:dict) -> float:
+    s = ev.get("start", {})
+    iso = s.get("dateTime") or (s.get("date")+"T00:00:00+00:00" if s.get("date") else None)
+    return dt.datetime.fromisoformat(iso.replace("Z","+00:00")).timestamp() if iso else float("inf")
+
+def list_events_multi(creds:Credentials, max_results:int=10, calendar_ids:list[str] | None = None):
+    """Fetch every selected calendar concurrently and heap-merge the already-ordered results."""
+    ids = calendar_ids or event_store.calendar_ids(build_service(creds), "all")
+    time_min = dt.datetime.utcnow().isoformat()+"Z"
+    def one(cid):
+        svc = build_service(creds)  # per-thread service from the pool
+        resp = gapi.execute(svc.events().list(calendarId=cid, timeMin=time_min, maxResults=max_results,
+                                              singleEvents=True, orderBy="startTime"))
+        return [dict(ev, calendarId=cid) for ev in resp.get("items", [])]
+    runs, errors = event_store.gather({cid: event_store.executor().submit(one, cid) for cid in ids})
+    if errors and not runs: raise next(iter(errors.values()))
+    return list(itertools.islice(heapq.merge(*runs.values(), key=_start_key), max_results))
+
 def list_events_safe(max_results:int=10, calendar_id="primary"):
+    """calendar_id="all" reads every selected calendar in the user's calendarList."""
     ok, svc = ensure_authed()
     if not ok:
         return {"ok": False, "items": [], "message": "Google not connected. Reconnect and retry."}
     try:
+        if calendar_id == "all":
+            return {"ok": True, "items": list_events_multi(load_creds(), max_results)}
         time_min = dt.datetime.utcnow().isoformat()+"Z"
-        resp = svc.events().list(calendarId=calendar_id, timeMin=time_min,
-                                 maxResults=max_results, singleEvents=True,
-                                 orderBy="startTime").execute()
+        resp = gapi.execute(svc.events().list(calendarId=calendar_id, timeMin=time_min,
+                                              maxResults=max_results, singleEvents=True,
+                                              orderBy="startTime"))
         return {"ok": True, "items": resp.get("items", [])}
     except Exception as e:
         return {"ok": False, "items": [], "message": "Calendar read failed. Try again later.", "error": str(e)}
 
 def _queue(body:dict, calendar_id="primary"):
-    p = _pending_path()
-    q = json.loads(p.read_text()) if p.exists() else []
-    q.append({"id": str(uuid.uuid4()), "calendar_id": calendar_id, "body": body, "queued_at": dt.datetime.utcnow().isoformat()+"Z"})
-    p.write_text(json.dumps(q, indent=2))
-    return q[-1]["id"]
+    return pending_queue.enqueue(_safe_email(), body, calendar_id)
 
-def create_event_safe(summary:str, start_iso:str, end_iso:str, timezone:str="Asia/Kolkata", calendar_id="primary"):
+def create_event_safe(summary:str, start_iso:str, end_iso:str, timezone:str=LOCAL_TZ, calendar_id="primary"):
+    import reconcile
+    user = _safe_email()
+    fp = reconcile.fingerprint_iso(summary, start_iso, timezone)
+    dup = reconcile.lookup(user, fp)
+    if dup: return {"ok": True, "duplicate": True, "event_id": dup.split("/", 1)[1], "message": "Already on the calendar."}
     ok, svc = ensure_authed()
     body = {"summary": summary, "start":{"dateTime":start_iso,"timeZone":timezone}, "end":{"dateTime":end_iso,"timeZone":timezone}}
     if not ok:
         qid = _queue(body, calendar_id)
         return {"ok": False, "queued": True, "queued_id": qid, "message": "Not connected. Event queued."}
     try:
-        ev = svc.events().insert(calendarId=calendar_id, body=body).execute()
+        ev = gapi.execute(svc.events().insert(calendarId=calendar_id, body=body))
+        reconcile.remember(user, {fp: f"{calendar_id}/{ev['id']}"})
         return {"ok": True, "event": ev}
     except Exception as e:
         qid = _queue(body, calendar_id)
         return {"ok": False, "queued": True, "queued_id": qid, "message": "Write failed. Event queued.", "error": str(e)}
 
-def retry_pending():
-    p = _pending_path()
-    if not p.exists(): return {"attempted":0,"success":0,"failed":0,"remaining":0}
-    ok, svc = ensure_authed()
-    q = json.loads(p.read_text())
-    if not ok: return {"attempted":0,"success":0,"failed":0,"remaining":len(q),"message":"Not connected"}
-    new, s, f = [], 0, 0
-    for item in q:
-        try: svc.events().insert(calendarId=item["calendar_id"], body=item["body"]).execute(); s+=1
-        except Exception: new.append(item); f+=1
-    p.write_text(json.dumps(new, indent=2))
-    return {"attempted":len(q),"success":s,"failed":f,"remaining":len(new)}
+_rate_limited = gapi.rate_limited
+
+def _insert_batch(svc, items) -> tuple[dict, dict]:
+    """One HTTP batch of inserts; returns ({queue id: event}, {queue id: exception})."""
+    done, errors = {}, {}
+    def cb(request_id, response, exception):
+        if exception is None: done[request_id] = response
+        else: errors[request_id] = exception
+    batch = svc.new_batch_http_request(callback=cb)
+    for item in items:
+        batch.add(svc.events().insert(calendarId=item["calendar_id"], body=item["body"]), request_id=item["id"])
+    # quota is charged per inner request; flush_batched owns the retries
+    gapi.execute(batch, key=gapi.key_for(svc), cost=len(items), retries=0)
+    return done, errors
+
+def flush_batched(svc, items, sleep=time.sleep, results: dict | None = None) -> tuple[list, list, int]:
+    """Insert items in batches of BATCH_SIZE, re-sending rate-limited (and 5xx) ones with exponential
+    backoff. This is the only retry layer for batches: at most BATCH_MAX_ROUNDS sends per chunk. Returns (sent ids, items still pending, rate-limited responses seen);
+    created events go into results by id."""
+    sent, keep, throttled = [], [], 0
+    for i in range(0, len(items), BATCH_SIZE):
+        chunk = items[i:i+BATCH_SIZE]
+        for rnd in range(BATCH_MAX_ROUNDS):
+            try: done, errors = _insert_batch(svc, chunk)
+            except Exception as e:
+                if not gapi.retryable(e): keep.extend(chunk); chunk = []; break
+                done, errors = {}, {it["id"]: e for it in chunk}
+            sent.extend(done)
+            if results is not None: results.update(done)
+            again = [it for it in chunk if gapi.retryable(errors.get(it["id"]))]
+            keep.extend(it for it in chunk if it["id"] in errors and it not in again)
+            throttled += sum(1 for it in again if _rate_limited(errors[it["id"]]))
+            chunk = again
+            if not chunk or rnd == BATCH_MAX_ROUNDS - 1: break
+            sleep(BATCH_BACKOFF_BASE * 2**rnd + random.uniform(0, BATCH_BACKOFF_BASE))
+        keep.extend(chunk)
+    return sent, keep, throttled
+
+def claim_size() -> int:
+    """Items to claim at once so the slowest flush (every item sent every round at GAPI_USER_QPS,
+    plus the backoffs) finishes within half a lease; an expired lease hands items out twice."""
+    batch = (BATCH_SIZE * BATCH_MAX_ROUNDS / gapi.USER_QPS
+             + BATCH_BACKOFF_BASE * (2 ** (BATCH_MAX_ROUNDS - 1) - 1 + BATCH_MAX_ROUNDS - 1))
+    return BATCH_SIZE * max(1, int(pending_queue.LEASE_SECONDS / 2 // batch))
+
+def retry_pending(user: str | None = None):
+    user = user or _safe_email()
+    pending_queue.import_legacy(user, _pending_path(user))
+    if not pending_queue.depth(user): return {"attempted":0,"success":0,"failed":0,"remaining":0}
+    ok, svc = ensure_authed(user)
+    if not ok: return {"attempted":0,"success":0,"failed":0,"remaining":pending_queue.depth(user),"message":"Not connected"}
+    attempted, sent_n, throttled, held, seen = 0, 0, 0, [], set()
+    try:
+        while True:  # chunk by chunk; failed items stay claimed until the end so they aren't re-claimed here
+            q = pending_queue.claim(user, claim_size())
+            fresh = [it for it in q if it["id"] not in seen]
+            held += [it["id"] for it in q if it["id"] in seen]  # a kept item whose lease ran out
+            if not fresh: break
+            seen.update(it["id"] for it in fresh)
+            try:
+                sent, new, t = flush_batched(svc, fresh)
+            except Exception:
+                held += [it["id"] for it in fresh]; raise
+            pending_queue.ack(sent); held += [it["id"] for it in new]
+            attempted += len(fresh); sent_n += len(sent); throttled += t
+            pending_queue.FLUSHED.inc(len(sent), result="sent")
+    finally:
+        pending_queue.release(held)
+    pending_queue.FLUSHED.inc(attempted - sent_n, result="kept")
+    return {"attempted":attempted,"success":sent_n,"failed":attempted-sent_n,"remaining":pending_queue.depth(user),"rate_limited":throttled}
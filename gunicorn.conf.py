@@ -0,0 +1,17 @@
+# Picked up automatically by `gunicorn app:app`. PRELOAD=1 imports the app (and its heavy
+# Google/dateparser/geo dependencies) once in the master and forks workers copy-on-write.
+import os
+
+preload_app = os.getenv("PRELOAD") == "1"
+# workers (and a preloaded master) share metrics here, so /metrics on any of them sums all of them;
+# set before the app is imported, which --preload does before on_starting runs
+os.environ.setdefault("METRICS_DIR", os.path.join(os.getenv("PERSIST_DIR", "scheduled_data"), "metrics"))
+
+def on_starting(server):
+    # counters from the previous deployment's processes would otherwise be summed in forever
+    import metrics; metrics.clear(os.environ["METRICS_DIR"])
+
+def post_fork(server, worker):
+    # threads don't survive fork, so with --preload the in-process sync scheduler starts here
+    if preload_app and os.getenv("SYNC_WORKER") == "thread":
+        import sync_worker; sync_worker.start_thread()
@@ -0,0 +1,164 @@
+"""
+Bulk import of .ics / .csv calendars into a user's entry file.
+A generator pipeline: parse records -> normalize to the entry grammar (`Mon D H:MM AM …` for
+timed events, `Mon D …` for all-day ones) -> entry_index.add_many, which classifies and appends
+chunk by chunk under one lock. The upload is never held whole; the user's entry index (one row
+per entry, old and new) is, and is written once at the end. UTC (`…Z`), TZID= and
+offset-bearing CSV times are converted to LOCAL_TZ wall-clock time, which is what entry lines
+mean. Entry lines carry no year, so only records dated in the current year are imported; the
+rest are counted as skipped.
+
+    python importer.py user@example.com calendar.ics [--dry-run]
+"""
+import io, re, csv, sys, pathlib
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+import classifier
+from event_model import LOCAL_TZ
+
+ICS_DT_RE = re.compile(r"^(\d{4})(\d{2})(\d{2})(?:T(\d{2})(\d{2})(\d{2})?(Z)?)?$")
+CSV_TITLE = ("subject", "summary", "title", "event", "name")
+CSV_DATE = ("start date", "start", "date", "dtstart", "when")
+CSV_TIME = ("start time", "time")
+CSV_LOCATION = ("location", "where")
+CSV_DATE_FORMATS = ("%m/%d/%Y", "%Y-%m-%d", "%d.%m.%Y", "%m/%d/%y")
+
+# ===== Parsers: text stream -> {"summary", "start": datetime, "all_day", "location"} =====
+def _unfold(fh):
+    """RFC 5545 lines: a line starting with a space or tab continues the previous one."""
+    prev = None
+    for raw in fh:
+        raw = raw.rstrip("\r\n")
+        if raw[:1] in (" ", "\t") and prev is not None: prev += raw[1:]; continue
+        if prev is not None: yield prev
+        prev = raw
+    if prev is not None: yield prev
+
+def _ics_text(v:str) -> str:
+    return v.replace("\\n", " ").replace("\\N", " ").replace("\\,", ",").replace("\\;", ";").replace("\\\\", "\\")
+
+def _zone(tzid:str | None):
+    if not tzid: return None
+    try: return ZoneInfo(tzid.strip('"'))
+    except Exception: return None  # Outlook's "India Standard Time" etc.: read as floating
+
+def _local(d:datetime) -> datetime:
+    """An aware datetime as naive LOCAL_TZ wall-clock time."""
+    return d.astimezone(ZoneInfo(LOCAL_TZ)).replace(tzinfo=None)
+
+def _ics_dt(v:str, tzid:str | None = None):
+    """DTSTART value -> (naive LOCAL_TZ wall-clock datetime, all_day). Floating times are kept as written."""
+    m = ICS_DT_RE.match(v.strip())
+    if not m: return None, False
+    y, mo, d, h, mi, s, z = m.groups()
+    try:
+        if h is None: return datetime(int(y), int(mo), int(d)), True
+        start = datetime(int(y), int(mo), int(d), int(h), int(mi), int(s or 0))
+    except ValueError:
+        return None, False
+    tz = timezone.utc if z else _zone(tzid)
+    if tz is not None: start = _local(start.replace(tzinfo=tz))
+    return start, False
+
+def _param(name:str, key:str) -> str | None:
+    for part in name.split(";")[1:]:
+        k, _, v = part.partition("=")
+        if k.upper() == key: return v
+    return None
+
+def iter_ics(fh):
+    ev = None
+    for line in _unfold(fh):
+        if line == "BEGIN:VEVENT": ev = {}; continue
+        if ev is None: continue
+        if line == "END:VEVENT":
+            if ev.get("start") and ev.get("status") != "CANCELLED": yield ev
+            ev = None; continue
+        name, _, value = line.partition(":")
+        prop = name.split(";", 1)[0].upper()
+        if prop == "SUMMARY": ev["summary"] = _ics_text(value)
+        elif prop == "LOCATION": ev["location"] = _ics_text(value)
+        elif prop == "STATUS": ev["status"] = value.strip().upper()
+        elif prop == "DTSTART": ev["start"], ev["all_day"] = _ics_dt(value, _param(name, "TZID"))
+
+def _col(row:dict, names) -> str:
+    for n in names:
+        v = row.get(n)
+        if v: return v.strip()
+    return ""
+
+def _csv_date(text:str):
+    for fmt in CSV_DATE_FORMATS:
+        try: return datetime.strptime(text, fmt)
+        except ValueError: continue
+    return classifier.parse_when(text)
+
+def iter_csv(fh):
+    reader = csv.DictReader(fh)
+    reader.fieldnames = [(f or "").strip().lower() for f in reader.fieldnames or []]
+    for row in reader:
+        date, time = _col(row, CSV_DATE), _col(row, CSV_TIME)
+        if not date: continue
+        start = _csv_date(date)
+        if start is None: continue
+        if start.tzinfo is not None: start, all_day = _local(start), False  # "…Z" / "+05:30": same instant as in an .ics
+        else: all_day = not time and (start.hour, start.minute) == (0, 0) and not classifier.TIME_ANY_RE.search(date)
+        if time:
+            t = classifier.TIME_ANY_RE.search(time)
+            try:
+                h, mi = classifier._hm(t) if t else map(int, time.split(":")[:2])
+                start = start.replace(hour=h, minute=mi)
+            except (TypeError, ValueError): all_day = True  # unreadable or out-of-range time
+        yield {"summary": _col(row, CSV_TITLE), "start": start, "all_day": all_day, "location": _col(row, CSV_LOCATION)}
+
+# ===== Normalization =====
+def to_line(rec:dict) -> str | None:
+    """One record in the grammar classify() understands; None if it has no title."""
+    title = " ".join((rec.get("summary") or "").split())
+    if not title: return None
+    loc = " ".join((rec.get("location") or "").split())
+    if loc and loc.lower() not in title.lower(): title = f"{title} ({loc})"
+    d = rec["start"]
+    if rec.get("all_day"): return f"{d:%b} {d.day} {title}"
+    return f"{d:%b} {d.day} {(d.hour % 12) or 12}:{d.minute:02d} {'AM' if d.hour < 12 else 'PM'} {title}"
+
+def detect(fh, filename:str = "") -> str:
+    ext = pathlib.Path(filename).suffix.lower()
+    if ext in (".ics", ".ical", ".ifb"): return "ics"
+    if ext == ".csv": return "csv"
+    return "ics" if fh.buffer.peek(15)[:15].lstrip(b"\xef\xbb\xbf").startswith(b"BEGIN:VCALENDAR") else "csv"
+
+def lines(fh, kind:str, year:int | None = None, skipped:dict | None = None):
+    """Entry lines for the records dated in `year` (default: this year in LOCAL_TZ); any other
+    year would read back as this one's. Those are counted in skipped["other_year"]."""
+    year = year or datetime.now(ZoneInfo(LOCAL_TZ)).year
+    skipped = {} if skipped is None else skipped
+    for rec in iter_ics(fh) if kind == "ics" else iter_csv(fh):
+        if rec["start"].year != year:
+            skipped["other_year"] = skipped.get("other_year", 0) + 1; continue
+        ln = to_line(rec)
+        if ln: yield ln
+
+def text_stream(binary) -> io.TextIOWrapper:
+    """Uploaded bytes -> text without reading it all (BOM stripped, newlines kept for csv)."""
+    if not hasattr(binary, "peek"): binary = io.BufferedReader(binary)
+    return io.TextIOWrapper(binary, encoding="utf-8-sig", errors="replace", newline="")
+
+def import_file(email:str, binary, filename:str = "") -> dict:
+    import entry_index
+    fh = text_stream(binary)
+    kind = detect(fh, filename)
+    skipped = {"other_year": 0}
+    n = entry_index.add_many(email, lines(fh, kind, skipped=skipped))
+    return {"ok": True, "format": kind, "imported": n, "skipped": skipped["other_year"]}
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        sys.exit("usage: python importer.py <email> <file.ics|file.csv> [--dry-run]")
+    email, path = sys.argv[1], sys.argv[2]
+    with open(path, "rb") as raw:
+        if "--dry-run" in sys.argv:
+            fh = text_stream(raw)
+            for ln in lines(fh, detect(fh, path)): print(ln)
+        else:
+            print(import_file(email, raw, path))
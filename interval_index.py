@@ -0,0 +1,215 @@
+"""
+Interval index over a user's busy time: synced Google events plus timed local entries.
+Intervals are kept sorted by start next to a running max of their ends, so "what overlaps
+[a, b)" is two binary searches plus one vectorized filter. Conflict pairs and free-slot gaps
+are computed on the same arrays. NumPy is used when installed (imported on first use);
+otherwise the same algorithms run on lists with bisect.
+
+Per-user indexes are cached in memory and brought forward with event_store.changes_since(),
+so a sync that touched three events rebuilds three rows, not the year. Both read the event
+store's per-process parsed copy, so a query whose store hasn't changed costs a stat, and one
+after a sync pays for a single JSON parse shared with every other reader in the process.
+"""
+import os, bisect, threading
+from collections import OrderedDict
+from itertools import accumulate
+from datetime import datetime, timedelta
+import event_store
+from event_model import format_iso, LOCAL_TZ
+
+LOCAL_MINUTES = int(os.getenv("LOCAL_ENTRY_MINUTES", "30"))  # assumed length of a timed local entry
+CACHE_SIZE = int(os.getenv("INTERVAL_CACHE_SIZE", "256"))    # users kept in memory
+
+_np = None
+
+def _numpy():
+    global _np
+    if _np is None:
+        try: import numpy as _np_mod
+        except ImportError: _np_mod = False
+        _np = _np_mod
+    return _np or None
+
+# item = (key, title, source, offset) - kept as a tuple; dicts are only built for responses
+class IntervalIndex:
+    __slots__ = ("starts", "ends", "maxend", "items", "np")
+
+    def __init__(self, rows):
+        """rows: iterable of (start, end, item) with end > start, epoch seconds."""
+        rows = sorted(rows, key=lambda r: (r[0], r[1]))
+        self.items = [r[2] for r in rows]
+        self.np = np = _numpy()
+        if np:
+            self.starts = np.fromiter((r[0] for r in rows), np.int64, len(rows))
+            self.ends = np.fromiter((r[1] for r in rows), np.int64, len(rows))
+            self.maxend = np.maximum.accumulate(self.ends) if len(rows) else self.ends
+        else:
+            self.starts = [r[0] for r in rows]
+            self.ends = [r[1] for r in rows]
+            self.maxend = list(accumulate(self.ends, max))
+
+    def __len__(self): return len(self.items)
+
+    def _span(self, a: int, b: int) -> tuple[int, int]:
+        """Candidates are [i, j): start < b, and nothing before i can still be running at a."""
+        if self.np:
+            return int(self.np.searchsorted(self.maxend, a, "right")), int(self.np.searchsorted(self.starts, b, "left"))
+        return bisect.bisect_right(self.maxend, a), bisect.bisect_left(self.starts, b)
+
+    def overlapping(self, a: int, b: int) -> list[int]:
+        """Positions of intervals overlapping [a, b), in start order."""
+        i, j = self._span(a, b)
+        if self.np: return (i + self.np.nonzero(self.ends[i:j] > a)[0]).tolist()
+        return [k for k in range(i, j) if self.ends[k] > a]
+
+    def conflicts(self, a: int, b: int) -> list[tuple[int, int]]:
+        """(earlier, later) position pairs that overlap each other, where the earlier one overlaps [a, b)."""
+        ks = self.overlapping(a, b)
+        _, jb = self._span(a, b)
+        if self.np and ks:
+            np = self.np
+            ks = np.asarray(ks, dtype=np.int64)
+            his = np.minimum(np.searchsorted(self.starts, self.ends[ks], "left"), jb)
+            counts = np.maximum(his - ks - 1, 0)
+            total = int(counts.sum())
+            if not total: return []
+            first = np.repeat(ks, counts)
+            offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            return list(zip(first.tolist(), (first + 1 + offsets).tolist()))
+        out = []
+        for k in ks:
+            hi = min(bisect.bisect_left(self.starts, self.ends[k]), jb)
+            out.extend((k, m) for m in range(k + 1, hi))
+        return out
+
+    def busy(self, a: int, b: int) -> list[tuple[int, int]]:
+        """Overlapping intervals merged into disjoint blocks, clipped to [a, b)."""
+        ks = self.overlapping(a, b)
+        if not ks: return []
+        if self.np:
+            np = self.np
+            s = np.maximum(self.starts[ks], a); e = np.minimum(self.ends[ks], b)
+            run = np.maximum.accumulate(e)
+            new = np.ones(len(s), bool); new[1:] = s[1:] > run[:-1]
+            heads = np.nonzero(new)[0]
+            tails = np.append(heads[1:] - 1, len(s) - 1)
+            return list(zip(s[heads].tolist(), run[tails].tolist()))
+        blocks = []
+        for k in ks:
+            s, e = max(self.starts[k], a), min(self.ends[k], b)
+            if blocks and s <= blocks[-1][1]: blocks[-1][1] = max(blocks[-1][1], e)
+            else: blocks.append([s, e])
+        return [tuple(x) for x in blocks]
+
+    def free(self, a: int, b: int, min_seconds: int = 0, windows=None) -> list[tuple[int, int]]:
+        """Gaps of at least min_seconds in [a, b) not covered by any interval; windows (sorted,
+        disjoint (start, end) pairs such as working hours) restrict where gaps may fall."""
+        blocks = self.busy(a, b)
+        gaps, cur = [], a
+        for s, e in blocks:
+            if s > cur: gaps.append((cur, s))
+            cur = max(cur, e)
+        if cur < b: gaps.append((cur, b))
+        if windows is not None:
+            clipped, w = [], 0
+            for gs, ge in gaps:  # both lists are sorted: one merge pass
+                while w < len(windows) and windows[w][1] <= gs: w += 1
+                k = w
+                while k < len(windows) and windows[k][0] < ge:
+                    s, e = max(gs, windows[k][0]), min(ge, windows[k][1])
+                    if e > s: clipped.append((s, e))
+                    k += 1
+            gaps = clipped
+        return [(s, e) for s, e in gaps if e - s >= min_seconds]
+
+    def describe(self, k: int) -> dict:
+        key, title, source, offset = self.items[k]
+        return {"id": key, "title": title, "source": source,
+                "start": format_iso(int(self.starts[k]), offset), "end": format_iso(int(self.ends[k]), offset)}
+
+# ===== Per-user state, kept current from the event store's revision log =====
+class _State:
+    __slots__ = ("rev", "google", "local_stamp", "local", "index", "lock")
+    def __init__(self):
+        self.rev, self.google, self.local_stamp, self.local, self.index = -1, {}, None, [], None
+        self.lock = threading.Lock()
+
+_states: OrderedDict[str, _State] = OrderedDict()
+_lock = threading.Lock()
+
+def _google_row(ev):
+    """Row for an event_store Event record; epoch seconds are already on it."""
+    start, end, offset = ev.start_ts, ev.end_ts, ev.offset
+    if start is None or offset is None or not end or end <= start: return None  # all-day / zero-length: not busy
+    return (start, end, (f"{ev.calendar_id}/{ev.id}", ev.summary, "google", offset))
+
+def _full_google(data: dict) -> tuple[int, dict]:
+    rows = {}
+    for cid in data.get("selected") or ["primary"]:
+        for ev in data["calendars"].get(cid, {}).get("events", ()):
+            row = _google_row(ev)
+            if row: rows[row[2][0]] = row
+    return data.get("rev", 0), rows
+
+def _local_row(n: int, line: str, now: datetime, tz) -> tuple | None:
+    """Row for one schedule line: the time that put it in "schedule", on its date prefix or today."""
+    import classifier
+    when = classifier.schedule_when(line, now)
+    if when is None: return None
+    when = when.replace(tzinfo=tz)
+    start = int(when.timestamp())
+    return (start, start + LOCAL_MINUTES * 60, (f"local/{n}", line, "local", int(when.utcoffset().total_seconds() // 60)))
+
+def _local_rows(email: str) -> list:
+    import entry_index
+    from zoneinfo import ZoneInfo
+    tz, now = ZoneInfo(LOCAL_TZ), datetime.now(ZoneInfo(LOCAL_TZ)).replace(tzinfo=None)
+    schedule = entry_index.classified(email)[0]  # the lines with a time
+    return [r for r in (_local_row(n, line, now, tz) for n, line in enumerate(schedule)) if r]
+
+def for_user(user: str, email: str | None = None) -> IntervalIndex:
+    """The user's index, updated from changes_since() rather than rebuilt when the store moved on."""
+    with _lock:
+        st = _states.pop(user, None) or _State()
+        _states[user] = st
+        while len(_states) > CACHE_SIZE: _states.popitem(last=False)
+    with st.lock:
+        return _refresh(st, user, email)
+
+def _refresh(st: _State, user: str, email: str | None) -> IntervalIndex:
+    import entry_index
+    data = event_store.load(user)  # one read of the store per refresh; changes_since() reuses it
+    rev = data.get("rev", 0)
+    if st.rev != rev:
+        ch = event_store.changes_since(user, st.rev) if 0 <= st.rev < rev else {"full": True}
+        if ch["full"]:
+            st.rev, st.google = _full_google(data)
+        else:
+            google = dict(st.google)
+            for r in ch["removed"]: google.pop(f"{r['calendarId']}/{r['id']}", None)
+            for ev in ch["changed"]:
+                key = f"{ev.calendar_id}/{ev.id}"
+                row = _google_row(ev)
+                if row: google[key] = row
+                else: google.pop(key, None)
+            st.rev, st.google = ch["rev"], google
+        st.index = None
+    # time-only entries mean "today", so the day is part of the local stamp
+    stamp = (entry_index._stamp(email), datetime.now().date()) if email else None
+    if stamp != st.local_stamp:
+        st.local, st.local_stamp, st.index = (_local_rows(email) if email else []), stamp, None
+    if st.index is None:
+        st.index = IntervalIndex([*st.google.values(), *st.local])
+    return st.index
+
+def work_windows(a: int, b: int, day_start: float, day_end: float, tz_name: str = LOCAL_TZ) -> list[tuple[int, int]]:
+    """Daily [day_start, day_end) hour windows in tz_name covering [a, b)."""
+    from zoneinfo import ZoneInfo
+    tz = ZoneInfo(tz_name)
+    day = datetime.fromtimestamp(a, tz).replace(hour=0, minute=0, second=0, microsecond=0)
+    out = []
+    while int(day.timestamp()) < b:
+        ws = int((day + timedelta(hours=day_start)).timestamp()); we = int((day + timedelta(hours=day_end)).timestamp())
+        if we > a and ws < b: out.append((max(ws, a), min(we, b)))
+        day = (day + timedelta(days=1, hours=2)).replace(hour=0)  # +2h keeps DST days from skipping
+    return out
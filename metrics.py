@@ -0,0 +1,193 @@
+"""
+Metrics rendered in the Prometheus text format (served at /metrics).
+Counters and histograms are plain dicts under one lock, so recording costs a few hundred
+nanoseconds; gauges are callbacks evaluated at scrape time by the process serving the scrape.
+Server processes share their numbers: with METRICS_DIR set (gunicorn.conf.py sets it for its
+workers; the sync worker calls share()), each writes its counters and histograms to
+METRICS_DIR/<pid>.json every METRICS_FLUSH seconds and a scrape sums all of those files, so any
+worker returns the totals for the whole deployment. CLIs and benches write nothing.
+"""
+import os, json, time, atexit, bisect, pathlib, threading
+from contextlib import contextmanager
+
+METRICS_DIR = os.getenv("METRICS_DIR")  # unset: this process's numbers only
+FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH", "5"))
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+FAST_BUCKETS = (1e-6, 5e-6, 1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3)  # per-line classifier work
+
+_lock = threading.Lock()
+_flush_lock = threading.Lock()  # one writer of <pid>.json at a time: the flusher thread and /metrics renders
+_registry: list = []
+_changes = 0   # bumped by every record; the flusher skips the write while nothing moved
+_flushed = 0
+_shared: pathlib.Path | None = None  # directory this process flushes to and sums on render
+
+def _esc(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _fmt_labels(names, values, extra=()) -> str:
+    pairs = [*zip(names, values), *extra]
+    return "{" + ",".join(f'{k}="{_esc(v)}"' for k, v in pairs) + "}"
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self.values: dict[tuple, float] = {}
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        global _changes
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with _lock: self.values[key] = self.values.get(key, 0) + amount; _changes += 1
+
+    @staticmethod
+    def merge(acc, v): return (acc or 0) + v
+
+    def render(self, values: dict | None = None) -> list[str]:
+        if values is None:
+            with _lock: values = dict(self.values)
+        items = values.items()
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter",
+                *(f"{self.name}{_fmt_labels(self.labels, k)} {v}" for k, v in items)]
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self.values: dict[tuple, list] = {}  # key -> [per-bucket counts..., +Inf count, sum]
+        _registry.append(self)
+
+    def observe(self, value: float, **labels):
+        global _changes
+        key = tuple(labels.get(n, "") for n in self.labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            row = self.values.get(key)
+            if row is None: row = self.values[key] = [0] * (len(self.buckets) + 2)
+            row[i] += 1; row[-1] += value; _changes += 1
+
+    @staticmethod
+    def merge(acc, v): return [a + b for a, b in zip(acc, v)] if acc else list(v)
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try: yield
+        finally: self.observe(time.perf_counter() - t0, **labels)
+
+    def render(self, values: dict | None = None) -> list[str]:
+        if values is None:
+            with _lock: values = {k: list(v) for k, v in self.values.items()}
+        items = values.items()
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, row in items:
+            acc = 0
+            for le, n in zip((*self.buckets, "+Inf"), row[:-1]):
+                acc += n
+                out.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, [('le', le)])} {acc}")
+            out.append(f"{self.name}_sum{_fmt_labels(self.labels, key)} {row[-1]}")
+            out.append(f"{self.name}_count{_fmt_labels(self.labels, key)} {acc}")
+        return out
+
+class Gauge:
+    """Value read at scrape time: fn() returns a number or a {label value tuple: number} dict."""
+    def __init__(self, name: str, help: str, fn, labels: tuple = ()):
+        self.name, self.help, self.fn, self.labels = name, help, fn, labels
+        _registry.append(self)
+
+    def render(self, values=None) -> list[str]:
+        try: v = self.fn()
+        except Exception: return []  # a broken collector must not break the scrape
+        rows = v.items() if isinstance(v, dict) else [((), v)]
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge",
+                *(f"{self.name}{_fmt_labels(self.labels, k)} {float(n)}" for k, n in rows)]
+
+# ===== Cross-process aggregation =====
+def share(path):
+    """Flush this process's numbers to path/<pid>.json and sum that directory on render."""
+    global _shared
+    if _shared is not None: return
+    _shared = pathlib.Path(path)
+    _start()
+    atexit.register(_flush_quietly)
+
+def clear(path=None):
+    """Drop every process's file - for a fresh deployment (gunicorn on_starting)."""
+    d = pathlib.Path(path or _shared or METRICS_DIR or "")
+    if d.name:
+        for f in d.glob("*.json"): f.unlink(missing_ok=True)
+
+def _recorded() -> list:
+    return [m for m in list(_registry) if hasattr(m, "values")]
+
+def flush():
+    """Write this process's counters and histograms to <shared dir>/<pid>.json (atomic replace)."""
+    global _flushed
+    if _shared is None: return
+    with _flush_lock:  # held over the write too, so an older snapshot never replaces a newer one
+        with _lock:
+            if _changes == _flushed: return
+            snap, seen = {m.name: [[list(k), v] for k, v in m.values.items()] for m in _recorded()}, _changes
+            text = json.dumps(snap)
+        _shared.mkdir(parents=True, exist_ok=True)
+        p = _shared / f"{os.getpid()}.json"; tmp = p.with_suffix(".tmp")
+        tmp.write_text(text)
+        os.replace(tmp, p)
+        _flushed = seen
+
+def _collect() -> dict | None:
+    """{metric name: {label values: summed value}} over every process's file; None when not shared."""
+    if _shared is None: return None
+    try:
+        flush()
+        files = list(_shared.glob("*.json"))
+    except OSError: return None
+    kinds = {m.name: m for m in _recorded()}
+    out: dict = {}
+    for f in files:
+        try: snap = json.loads(f.read_text())
+        except (OSError, ValueError): continue  # a file being replaced; its numbers come next scrape
+        for name, rows in snap.items():
+            m = kinds.get(name)
+            if m is None: continue
+            acc = out.setdefault(name, {})
+            for k, v in rows:
+                k = tuple(k); acc[k] = m.merge(acc.get(k), v)
+    return out
+
+def _flush_quietly():
+    try: flush()
+    except OSError: pass
+
+def _flusher():
+    while True:
+        time.sleep(FLUSH_SECONDS)
+        _flush_quietly()
+
+def _start():
+    threading.Thread(target=_flusher, name="metrics-flush", daemon=True).start()
+
+def _after_fork():
+    # a forked worker starts from zero: what the parent recorded stays in the parent's file
+    global _lock, _flush_lock, _changes, _flushed
+    _lock, _flush_lock = threading.Lock(), threading.Lock()  # another thread may have held them across the fork
+    for m in _recorded(): m.values.clear()
+    _changes, _flushed = 0, 0
+    if _shared is not None: _start()
+
+os.register_at_fork(after_in_child=_after_fork)
+if METRICS_DIR: share(METRICS_DIR)
+
+def render() -> str:
+    merged = _collect()
+    if merged is None:  # not shared, or the directory is unreadable: this process's own numbers
+        return "\n".join(line for m in list(_registry) for line in m.render()) + "\n"
+    return "\n".join(line for m in list(_registry) for line in m.render(merged.get(m.name, {}))) + "\n"
+
+# ===== Hot-path metrics =====
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "Request latency by route.", ("route", "method", "status"))
+GAPI_LATENCY = Histogram("gapi_request_duration_seconds", "Google API call latency by method.", ("method", "outcome"))
+GAPI_EVENTS = Counter("gapi_events_total", "Google API retries, throttling and breaker rejections.", ("event",))
+CACHE_REQUESTS = Counter("cache_requests_total", "Server-side cache lookups.", ("kind", "result"))
+CLASSIFY_LOOKUPS = Counter("classifier_lookups_total", "Line classifications served from the memo or computed.", ("result",))
+CLASSIFY_LINE = Histogram("classifier_line_seconds", "Time to classify one uncached line.", buckets=FAST_BUCKETS)
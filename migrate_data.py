@@ -0,0 +1,122 @@
+"""
+Offline maintenance over every user in scheduled_data/: validate each <email>.txt, migrate the
+legacy SETTINGS: header into the settings sidecar (compaction), and rebuild the classified index
+with the current classify()/is_travel() rules. Users are spread over a ProcessPoolExecutor in
+chunks; finished chunks are appended to a checkpoint so an interrupted run picks up where it stopped.
+A run that finishes without errors deletes the checkpoint, so the next one (after the rules change)
+starts from the top.
+
+    python migrate_data.py --dry-run            # report + unified diffs, writes nothing
+    python migrate_data.py --workers 16         # migrate and reindex everyone
+    python migrate_data.py --reset              # ignore the checkpoint and start over
+"""
+import os, sys, json, time, difflib, argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import user_store
+import entry_index
+
+CHECKPOINT = user_store.DATA_DIR / "migrate.checkpoint"
+
+def _warm():
+    """Per-worker: load the geo tables once instead of on the first travel-looking line."""
+    try:
+        import geo_index; geo_index._load()
+    except Exception:
+        pass
+
+def _validate(raw:str) -> list[str]:
+    issues = []
+    lines = raw.splitlines()
+    if lines and lines[0].startswith("SETTINGS:"):
+        try: json.loads(lines[0][9:])
+        except ValueError: issues.append("unparseable SETTINGS header")
+    if raw and not raw.endswith("\n"): issues.append("no trailing newline")
+    if any(not ln.strip() for ln in lines): issues.append("blank lines")
+    if "�" in raw: issues.append("invalid utf-8")
+    return issues
+
+def _categories(idx:dict) -> dict:
+    return {ln: b for b in ("schedule", "dates", "travel") for _, ln in idx.get(b, [])} | \
+           {ln: "other" for ln in idx.get("other", [])}
+
+def migrate_user(user:str, dry_run:bool = False) -> dict:
+    p = user_store.user_file(user)
+    raw = p.read_bytes().decode("utf-8", errors="replace")
+    issues = _validate(raw)
+    needs_compact = raw.startswith("SETTINGS:") or "no trailing newline" in issues or "blank lines" in issues
+    old_idx = entry_index._load_valid(user) or {}
+    out = {"user": user, "issues": issues, "compacted": needs_compact}
+    if dry_run:
+        new_idx = entry_index.rebuild(user)
+        before, after = _categories(old_idx), _categories(new_idx)
+        moved = sorted(ln for ln in after if ln in before and before[ln] != after[ln])
+        out["reclassified"] = len(moved)
+        diff = []
+        if needs_compact:
+            diff += difflib.unified_diff(raw.splitlines(), user_store._lines(p), f"{p.name}", f"{p.name} (compacted)", lineterm="", n=0)
+        diff += [f"~ {before[ln]} -> {after[ln]}: {ln}" for ln in moved]
+        out["diff"] = diff
+        return out
+    if needs_compact: user_store.compact(user)
+    with user_store.locked(user):
+        new_idx = entry_index.rebuild(user)
+        entry_index._save(user, new_idx)
+    before, after = _categories(old_idx), _categories(new_idx)
+    out["reclassified"] = sum(1 for ln in after if ln in before and before[ln] != after[ln])
+    return out
+
+def migrate_chunk(users:list[str], dry_run:bool) -> list[dict]:
+    out = []
+    for u in users:
+        try: out.append(migrate_user(u, dry_run))
+        except Exception as e: out.append({"user": u, "error": f"{type(e).__name__}: {e}"})
+    return out
+
+def _done() -> set[str]:
+    if not CHECKPOINT.exists(): return set()
+    return set(CHECKPOINT.read_text(encoding="utf-8").split())
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workers", type=int, default=os.cpu_count())
+    ap.add_argument("--chunk", type=int, default=200, help="users per task / checkpoint entry")
+    ap.add_argument("--dry-run", action="store_true")
+    ap.add_argument("--reset", action="store_true", help="discard the checkpoint first")
+    ap.add_argument("--diff-limit", type=int, default=20, help="diff lines shown per user in --dry-run")
+    a = ap.parse_args()
+
+    if a.reset: CHECKPOINT.unlink(missing_ok=True)
+    done = set() if a.dry_run else _done()
+    users = sorted(p.stem for p in user_store.DATA_DIR.glob("*.txt") if p.stem not in done)
+    chunks = [users[i:i + a.chunk] for i in range(0, len(users), a.chunk)]
+    print(f"{len(users):,} users to process ({len(done):,} already done), {len(chunks)} chunks, {a.workers} workers"
+          + (" [dry run]" if a.dry_run else ""), file=sys.stderr)
+
+    totals = {"users": 0, "compacted": 0, "reclassified": 0, "with_issues": 0, "errors": 0}
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(a.workers, initializer=_warm) as pool, \
+         open(os.devnull if a.dry_run else CHECKPOINT, "a", encoding="utf-8") as ckpt:
+        futures = {pool.submit(migrate_chunk, c, a.dry_run): c for c in chunks}
+        for fut in as_completed(futures):
+            ok = []
+            for r in fut.result():
+                totals["users"] += 1
+                if "error" in r: totals["errors"] += 1; print(f"! {r['user']}: {r['error']}"); continue
+                ok.append(r["user"])
+                totals["compacted"] += r["compacted"]; totals["reclassified"] += r["reclassified"]
+                totals["with_issues"] += bool(r["issues"])
+                if a.dry_run and (r["diff"] or r["issues"]):
+                    print(f"== {r['user']}" + (f"  ({', '.join(r['issues'])})" if r["issues"] else ""))
+                    for ln in r["diff"][:a.diff_limit]: print(ln)
+            ckpt.write("".join(u + "\n" for u in ok)); ckpt.flush()  # failed users are retried next run
+            el = time.perf_counter() - t0
+            rate = totals["users"] / el if el else 0
+            print(f"{totals['users']:,}/{len(users):,} users  {rate:,.0f}/s  eta {(len(users) - totals['users']) / rate if rate else 0:,.0f}s",
+                  file=sys.stderr)
+    print(json.dumps(totals))
+    if totals["errors"]: return 1
+    if not a.dry_run: CHECKPOINT.unlink(missing_ok=True)  # finished: the next run starts over
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
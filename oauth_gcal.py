@@ -8,7 +8,7 @@ from flask import current_app, session, request, url_for, redirect, jsonify
 from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
 from google_auth_oauthlib.flow import Flow
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+from service_pool import get_service
 
 AUTH_URI = "https://accounts.google.com/o/oauth2/auth"
 TOKEN_URI = "https://oauth2.googleapis.com/token"
@@ -76,7 +76,7 @@ def build_service():
     if not info:
         raise RuntimeError("No Google credentials in session")
     creds = Credentials.from_authorized_user_info(info)
-    return build("calendar", "v3", credentials=creds, cache_discovery=False)
+    return get_service(creds)
 
 def require_gcal(fn):
     @wraps(fn)
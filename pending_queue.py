@@ -0,0 +1,79 @@
+"""
+Durable pending-write queue for Google Calendar inserts.
+SQLite in WAL mode: O(1) appends, atomic claim/ack, and SQLite's file locks keep gunicorn workers from losing writes.
+"""
+import os, json, uuid, time, sqlite3, pathlib, threading, datetime as dt
+import metrics
+
+DATA_DIR = pathlib.Path(os.getenv("PERSIST_DIR", "scheduled_data")); DATA_DIR.mkdir(parents=True, exist_ok=True)
+DB_PATH = pathlib.Path(os.getenv("PENDING_DB", DATA_DIR / "gcal_pending.sqlite3"))
+LEASE_SECONDS = 300  # a claimed item is handed out again if never acked (crashed worker)
+
+_local = threading.local()
+FLUSHED = metrics.Counter("pending_flushed_total", "Queued writes handled by retry_pending.", ("result",))
+
+def _db() -> sqlite3.Connection:
+    db = getattr(_local, "db", None)
+    if db is None:
+        db = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL"); db.execute("PRAGMA synchronous=FULL")
+        db.execute("""CREATE TABLE IF NOT EXISTS pending (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT UNIQUE, user TEXT, calendar_id TEXT,
+            body TEXT, queued_at TEXT, claimed_until REAL)""")
+        db.execute("CREATE INDEX IF NOT EXISTS pending_user ON pending(user, seq)")
+        _local.db = db
+    return db
+
+def enqueue(user: str, body: dict, calendar_id: str = "primary", item_id: str | None = None, queued_at: str | None = None) -> str:
+    item_id = item_id or str(uuid.uuid4())
+    _db().execute("INSERT OR IGNORE INTO pending (id, user, calendar_id, body, queued_at) VALUES (?,?,?,?,?)",
+                  (item_id, user, calendar_id, json.dumps(body), queued_at or dt.datetime.utcnow().isoformat()+"Z"))
+    return item_id
+
+def claim(user: str, limit: int = -1, lease: float = LEASE_SECONDS) -> list[dict]:
+    """Atomically lease the oldest unclaimed items for user; ack() or release() them afterwards."""
+    db, now = _db(), time.time()
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        rows = db.execute("""SELECT seq, id, calendar_id, body, queued_at FROM pending
+                             WHERE user=? AND (claimed_until IS NULL OR claimed_until < ?) ORDER BY seq LIMIT ?""",
+                          (user, now, limit)).fetchall()
+        db.executemany("UPDATE pending SET claimed_until=? WHERE seq=?", [(now + lease, r[0]) for r in rows])
+        db.execute("COMMIT")
+    except Exception:
+        db.execute("ROLLBACK"); raise
+    return [{"id": r[1], "calendar_id": r[2], "body": json.loads(r[3]), "queued_at": r[4]} for r in rows]
+
+def ack(ids):
+    _db().executemany("DELETE FROM pending WHERE id=?", [(i,) for i in ids])
+
+def release(ids):
+    _db().executemany("UPDATE pending SET claimed_until=NULL WHERE id=?", [(i,) for i in ids])
+
+def depth(user: str | None = None) -> int:
+    if user is None: return _db().execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+    return _db().execute("SELECT COUNT(*) FROM pending WHERE user=?", (user,)).fetchone()[0]
+
+metrics.Gauge("pending_queue_depth", "Queued Google writes waiting for retry_pending.", lambda: depth())
+
+def users() -> list[str]:
+    return [r[0] for r in _db().execute("SELECT DISTINCT user FROM pending")]
+
+def import_legacy(user: str, path: pathlib.Path) -> int:
+    """Move items from an old rewrite-whole-file *_gcal_pending.json into the queue, keeping their ids.
+    Runs under the queue's write lock, so concurrent workers import the file once."""
+    if not path.exists(): return 0
+    db = _db()
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        if not path.exists(): db.execute("ROLLBACK"); return 0  # another process got there first
+        items = json.loads(path.read_text() or "[]")
+        for it in items:
+            enqueue(user, it["body"], it.get("calendar_id", "primary"), it.get("id"), it.get("queued_at"))
+        path.rename(path.with_suffix(".json.migrated"))
+        db.execute("COMMIT")
+    except FileNotFoundError:
+        db.execute("ROLLBACK"); return 0
+    except Exception:
+        db.execute("ROLLBACK"); raise
+    return len(items)
@@ -0,0 +1,205 @@
+"""
+Two-way reconciliation between a user's dated entries (scheduled_data/<email>.txt) and their
+synced Google events. Both sides are reduced to a fingerprint - normalized title + start minute
+(or day, for all-day items) in LOCAL_TZ - and put in dicts, so the diff is one pass over each side.
+Entries Google lacks go out through google_client.flush_batched(); with pull=True, events the
+file lacks are appended as entry lines. Every pairing is kept in <user>_gcal_map.json, so a later
+run skips what it already pushed even before the next sync brings it back.
+
+    python reconcile.py user@example.com [--dry-run] [--pull]
+"""
+import os, re, sys, json, pathlib, hashlib, threading
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+import classifier
+import event_store
+from event_model import LOCAL_TZ
+from interval_index import LOCAL_MINUTES
+
+DATA_DIR = pathlib.Path(os.getenv("PERSIST_DIR", "scheduled_data")); DATA_DIR.mkdir(parents=True, exist_ok=True)
+WORD_RE = re.compile(r"[^\w]+")
+
+_locks: dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+_remote: dict[str, tuple[int, dict]] = {}  # user -> (store revision, {fingerprint: "calendarId/eventId"})
+
+def user_key(email:str) -> str:
+    return email.replace("@","_at_").replace(".","_")  # same key google_client files use
+
+# ===== Fingerprints =====
+def fingerprint(title:str | None, start:str) -> str:
+    norm = WORD_RE.sub(" ", (title or "").casefold()).strip()
+    return hashlib.blake2b(f"{norm}\x1f{start}".encode(), digest_size=8).hexdigest()
+
+def _start_key(d:datetime, all_day:bool = False) -> str:
+    """Aware datetimes are compared as wall-clock time in LOCAL_TZ; naive ones already are."""
+    if all_day: return d.date().isoformat()
+    if d.tzinfo is not None: d = d.astimezone(ZoneInfo(LOCAL_TZ)).replace(tzinfo=None)
+    return d.isoformat(timespec="minutes")
+
+def fingerprint_iso(title:str | None, start_iso:str, tz:str | None = None) -> str:
+    """For create_event_safe-style arguments: naive start_iso is read in tz."""
+    d = datetime.fromisoformat(start_iso.replace("Z", "+00:00"))
+    if d.tzinfo is None and tz: d = d.replace(tzinfo=ZoneInfo(tz))
+    return fingerprint(title, _start_key(d))
+
+def parse_entry(line:str, now:datetime | None = None):
+    """Dated entry -> (title, start, all_day); None for undated or time-only ("today") lines.
+    Entry lines carry no year: parse_when() puts them in now's year."""
+    m = classifier.DATE_PREFIX_RE.match(line)
+    if not m: return None
+    when = classifier.parse_when(line, now)
+    if when is None: return None
+    rest = line[m.end():]
+    t = classifier.TIME_ANY_RE.search(rest)
+    if t: rest = rest[:t.start()] + rest[t.end():]
+    title = " ".join(rest.split()).strip(" -:,")
+    return (title, when, t is None) if title else None
+
+# ===== Indexes =====
+def local_index(email:str) -> dict:
+    """{fingerprint: (line, title, start, all_day)}; the first of several identical lines wins."""
+    import user_store
+    now = datetime.now(ZoneInfo(LOCAL_TZ)).replace(tzinfo=None)
+    out = {}
+    for line in user_store.read_lines(email):
+        e = parse_entry(line, now)
+        if e: out.setdefault(fingerprint(e[0], _start_key(e[1], e[2])), (line, *e))
+    return out
+
+def _event_start(ev) -> datetime:
+    return datetime.fromisoformat(ev.start)  # naive for all-day events, as normalize() stores them
+
+def _event_fingerprint(ev) -> str | None:
+    """For an event_store Event record."""
+    if ev.start_ts is None or ev.status == "cancelled": return None
+    d = _event_start(ev)
+    return fingerprint(ev.summary, _start_key(d, all_day=d.tzinfo is None))
+
+def remote_index(user:str) -> dict:
+    """{fingerprint: "calendarId/eventId"} over the synced store, rebuilt only when its revision moves."""
+    rev = event_store.revision(user)
+    hit = _remote.get(user)
+    if hit and hit[0] == rev: return hit[1]
+    data = event_store.load(user)
+    out = {}
+    for cid in data.get("selected") or ["primary"]:
+        for ev in data["calendars"].get(cid, {}).get("events", ()):
+            fp = _event_fingerprint(ev)
+            if fp: out.setdefault(fp, f"{cid}/{ev.id}")
+    _remote[user] = (data.get("rev", 0), out)
+    return out
+
+# ===== Mapping (<user>_gcal_map.json) =====
+def _map_path(user:str) -> pathlib.Path:
+    return DATA_DIR / f"{user}_gcal_map.json"
+
+def _lock(user:str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(user, threading.Lock())
+
+def load_map(user:str) -> dict:
+    p = _map_path(user)
+    if not p.exists(): return {}
+    try: return json.loads(p.read_text())
+    except Exception: return {}
+
+def _save_map(user:str, mapping:dict):
+    p = _map_path(user); tmp = p.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_text(json.dumps(mapping))
+    os.replace(tmp, p)
+
+def remember(user:str, pairs:dict):
+    """Merge {fingerprint: "calendarId/eventId"} into the user's mapping."""
+    if not pairs: return
+    with _lock(user):
+        _save_map(user, load_map(user) | pairs)
+
+def lookup(user:str, fp:str) -> str | None:
+    """The event a fingerprint is already paired with, from the mapping or the synced store."""
+    return load_map(user).get(fp) or remote_index(user).get(fp)
+
+# ===== Diff / push / pull =====
+def diff(local:dict, remote:dict, mapping:dict) -> tuple[list, list, int]:
+    """(fingerprints to push, fingerprints to pull, matched count) - one dict probe per item."""
+    push = [fp for fp in local if fp not in remote and fp not in mapping]
+    pull = [fp for fp in remote if fp not in local and fp not in mapping]  # paired once: a local delete stays deleted
+    return push, pull, sum(1 for fp in local if fp in remote)
+
+def _body(title:str, start:datetime, all_day:bool) -> dict:
+    if all_day:
+        return {"summary": title, "start": {"date": start.date().isoformat()},
+                "end": {"date": (start.date() + timedelta(days=1)).isoformat()}}
+    end = start + timedelta(minutes=LOCAL_MINUTES)
+    return {"summary": title, "start": {"dateTime": start.isoformat(), "timeZone": LOCAL_TZ},
+            "end": {"dateTime": end.isoformat(), "timeZone": LOCAL_TZ}}
+
+def _pull_lines(user:str, fps:list, year:int) -> dict:
+    """{fingerprint: entry line} for the given events that fall in `year`. An entry line has no
+    year of its own, so an event from any other year would read back as this year's and be pushed
+    again as a duplicate; those stay out of both the file and the mapping."""
+    import importer
+    data = event_store.load(user)
+    want = set(fps)
+    tz = ZoneInfo(LOCAL_TZ)
+    out = {}
+    for cid in data.get("selected") or ["primary"]:
+        for ev in data["calendars"].get(cid, {}).get("events", ()):
+            fp = _event_fingerprint(ev)
+            if fp not in want: continue
+            want.discard(fp)
+            d = _event_start(ev)
+            all_day = d.tzinfo is None
+            if not all_day: d = d.astimezone(tz).replace(tzinfo=None)
+            if d.year != year: continue
+            # no location: the line has to fingerprint back to the same event
+            line = importer.to_line({"summary": ev.summary, "start": d, "all_day": all_day})
+            if line: out[fp] = line
+    return out
+
+def run(email:str, creds=None, dry_run:bool = False, pull:bool = False, calendar_id:str = "primary") -> dict:
+    """Sync (when creds are given), diff both sides, push what Google lacks, optionally pull the rest."""
+    import google_client
+    user = user_key(email)
+    if creds is not None: event_store.sync_all(creds, user)
+    local, remote, mapping = local_index(email), remote_index(user), load_map(user)
+    to_push, to_pull, matched = diff(local, remote, mapping)
+    # before the synced window Google's side is unknown, so an entry there may already exist
+    since, tz = event_store.complete_from(event_store.load(user)), ZoneInfo(LOCAL_TZ)
+    unseen = {fp for fp in to_push if since is None or local[fp][2].replace(tzinfo=tz) < since}
+    to_push = [fp for fp in to_push if fp not in unseen]
+    pulls = _pull_lines(user, to_pull, datetime.now(ZoneInfo(LOCAL_TZ)).year) if pull and to_pull else {}
+    out = {"ok": True, "local": len(local), "remote": len(remote), "matched": matched,
+           "push": len(to_push), "pull": len(pulls), "unsynced": len(unseen), "pushed": 0, "pulled": 0, "failed": 0}
+    if dry_run:
+        out["push_lines"] = [local[fp][0] for fp in to_push]
+        if pull: out["pull_lines"] = list(pulls.values())
+        return out
+    pairs = {fp: remote[fp] for fp in local if fp in remote and fp not in mapping}
+    if to_push:
+        ok, svc = google_client.ensure_authed(user)
+        if not ok:
+            remember(user, pairs)
+            return dict(out, ok=False, message="Not connected")
+        if not google_client.can_write(google_client.load_creds(user)):  # a token from the read-only sign-in
+            remember(user, pairs)
+            return dict(out, ok=False, message="Google access is read-only. Sign in again to allow adding events.")
+        items = [{"id": fp, "calendar_id": calendar_id, "body": _body(*local[fp][1:])} for fp in to_push]
+        results = {}
+        sent, keep, _ = google_client.flush_batched(svc, items, results=results)
+        pairs.update({fp: f"{calendar_id}/{results[fp]['id']}" for fp in sent})
+        out["pushed"], out["failed"] = len(sent), len(keep)
+    if pulls:
+        import entry_index
+        out["pulled"] = entry_index.add_many(email, pulls.values())
+        pairs.update({fp: remote[fp] for fp in pulls})
+    remember(user, pairs)
+    return out
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit("usage: python reconcile.py <email> [--dry-run] [--pull]")
+    email = sys.argv[1]
+    import google_client
+    res = run(email, google_client.load_creds(user_key(email)), dry_run="--dry-run" in sys.argv, pull="--pull" in sys.argv)
+    print(json.dumps(res, indent=2))
@@ -0,0 +1,57 @@
+"""
+Per-credential pool of Calendar service objects.
+Built once from the discovery document bundled with google-api-python-client (no network fetch),
+one service per (credential, thread) so each gunicorn thread keeps its own keep-alive connection.
+"""
+import os, json, hashlib, threading
+from collections import OrderedDict
+
+POOL_SIZE = int(os.getenv("SERVICE_POOL_SIZE", "32"))        # services kept per thread
+HTTP_TIMEOUT = int(os.getenv("GOOGLE_HTTP_TIMEOUT", "30"))
+ROOT_URL = os.getenv("CALENDAR_ROOT_URL")                    # override for a local fake server
+
+_doc = None
+_doc_lock = threading.Lock()
+_local = threading.local()
+
+def discovery_doc() -> dict:
+    """The parsed discovery document, shared by every build. build_from_document() only adds the
+    same derived parameters to it on each call, so sharing one dict is safe and skips a json.loads."""
+    global _doc
+    if _doc is None:
+        with _doc_lock:
+            if _doc is None:
+                from googleapiclient import discovery_cache
+                doc = json.loads(discovery_cache.get_static_doc("calendar", "v3"))
+                if ROOT_URL: doc["rootUrl"] = ROOT_URL.rstrip("/") + "/"
+                _doc = doc
+    return _doc
+
+def identity(creds) -> str:
+    raw = f"{getattr(creds, 'client_id', '')}:{getattr(creds, 'refresh_token', None) or creds.token}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+def _new_service(creds):
+    import httplib2
+    from google_auth_httplib2 import AuthorizedHttp
+    from googleapiclient.discovery import build_from_document
+    http = AuthorizedHttp(creds, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+    return build_from_document(discovery_doc(), http=http)
+
+def get_service(creds):
+    """Return this thread's cached service for these credentials, building it on first use."""
+    pool = getattr(_local, "pool", None)
+    if pool is None: pool = _local.pool = OrderedDict()
+    key = identity(creds)
+    svc = pool.get(key)
+    if svc is None:
+        svc = pool[key] = _new_service(creds)
+        while len(pool) > POOL_SIZE: pool.popitem(last=False)
+    else:
+        svc._http.credentials = creds  # pick up a refreshed access token
+        pool.move_to_end(key)
+    return svc
+
+def evict(creds):
+    pool = getattr(_local, "pool", None)
+    if pool is not None: pool.pop(identity(creds), None)
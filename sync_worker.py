@@ -0,0 +1,97 @@
+"""
+Background sync: refreshes tokens before they expire, pulls calendar deltas into event_store
+and drains pending writes, so the web tier only reads precomputed data.
+
+    python sync_worker.py          # own process (Procfile `sync:`)
+    SYNC_WORKER=thread             # or a daemon thread inside the web process
+
+Only one scheduler runs per data directory: it holds an flock on scheduled_data/sync_worker.lock,
+and the others (every other gunicorn worker, or a second `sync` process) wait to take over.
+"""
+import os, time, fcntl, random, logging, threading
+from concurrent.futures import ThreadPoolExecutor
+import event_store
+import google_client
+
+INTERVAL = float(os.getenv("SYNC_INTERVAL", "120"))        # seconds between syncs of one user
+CONCURRENCY = int(os.getenv("SYNC_CONCURRENCY", "4"))      # users synced at once
+JITTER = float(os.getenv("SYNC_JITTER", "0.2"))            # +/- fraction of INTERVAL per run
+LEADER_POLL = float(os.getenv("SYNC_LEADER_POLL", "15"))   # seconds between takeover attempts
+LOCK_PATH = google_client.DATA_DIR / "sync_worker.lock"
+
+log = logging.getLogger("sync_worker")
+
+def sync_user(user: str) -> dict:
+    creds = google_client.load_creds(user)
+    if not creds: return {"user": user, "ok": False, "message": "no token"}
+    try: res = event_store.sync_all(creds, user)
+    except Exception as e:  # queued writes don't depend on the read side; drain them anyway
+        log.exception("sync failed for %s", user)
+        res = {"ok": False, "error": str(e)}
+    res["pending"] = google_client.retry_pending(user)
+    return dict(res, user=user)
+
+def _leader(stop: threading.Event):
+    """Block until this process holds the scheduler lock; returns the open lock file (None if stopped)."""
+    fh = open(LOCK_PATH, "a")
+    while not stop.is_set():
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return fh
+        except BlockingIOError:
+            stop.wait(LEADER_POLL)
+    fh.close()
+    return None
+
+class Scheduler:
+    def __init__(self, interval: float = INTERVAL, concurrency: int = CONCURRENCY):
+        self.interval = interval
+        self.pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="sync")
+        self.next_due: dict[str, float] = {}
+        self.running: set[str] = set()
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+
+    def _reschedule(self, user: str):
+        with self.lock:
+            self.running.discard(user)
+            self.next_due[user] = time.time() + self.interval * (1 + random.uniform(-JITTER, JITTER))
+
+    def _run(self, user: str):
+        try: log.info("synced %s", sync_user(user))
+        except Exception: log.exception("sync failed for %s", user)
+        finally: self._reschedule(user)
+
+    def tick(self) -> float:
+        """Submit every due user; returns seconds until the next one is due."""
+        now = time.time()
+        users = google_client.known_users()
+        with self.lock:
+            for u in users:  # new users start at a random offset so a restart doesn't thunder
+                self.next_due.setdefault(u, now + random.uniform(0, self.interval))
+            for u in set(self.next_due) - set(users): self.next_due.pop(u)
+            due = [u for u, t in self.next_due.items() if t <= now and u not in self.running]
+            self.running.update(due)
+        for u in due: self.pool.submit(self._run, u)
+        with self.lock:
+            waiting = [t for u, t in self.next_due.items() if u not in self.running]
+        return max(1.0, min(waiting, default=now + self.interval) - time.time())
+
+    def run_forever(self):
+        lock = _leader(self.stop)  # released with the process, so a surviving worker takes over
+        if lock is None: return
+        log.info("sync scheduler running in pid %s", os.getpid())
+        with lock:
+            while not self.stop.is_set():
+                self.stop.wait(self.tick())
+            self.pool.shutdown(wait=True)
+
+def start_thread() -> Scheduler:
+    sched = Scheduler()
+    threading.Thread(target=sched.run_forever, name="sync-scheduler", daemon=True).start()
+    return sched
+
+if __name__ == "__main__":
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+    import metrics; metrics.share(os.getenv("METRICS_DIR") or google_client.DATA_DIR / "metrics")  # Google call counts reach /metrics
+    Scheduler().run_forever()
@@ -0,0 +1,96 @@
+"""
+Single-pass trip extraction over event titles.
+The airline/airport/city gazetteer in data/gazetteer.json is compiled once (on first use) into one
+prefix-factored regex, so every event is scanned exactly once for all span kinds.
+"""
+import re, json, pathlib
+from functools import lru_cache
+from event_model import Trip
+
+GAZETTEER = json.loads((pathlib.Path(__file__).parent / "data" / "gazetteer.json").read_text(encoding="utf-8"))
+
+def _trie_rx(node: dict) -> str:
+    alts = [re.escape(ch) + _trie_rx(child) for ch, child in sorted(node.items()) if ch]
+    if not alts: return ""
+    if "" in node: return "(?:" + "|".join(alts) + ")?"
+    return alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+
+def _trie(words) -> str:
+    """Prefix-factored alternation: the regex engine walks a trie instead of trying each word in turn."""
+    root: dict = {}
+    for w in words:
+        node = root
+        for ch in w: node = node.setdefault(ch, {})
+        node[""] = {}
+    return _trie_rx(root)
+
+def _names(words) -> str:
+    # all-caps names (KLM, ITC, LOT) must match as written; the rest match in any case
+    exact = [w for w in words if w.isupper()]
+    loose = {w.lower() for w in words if not w.isupper()}
+    return "|".join(p for p in (_trie(exact), f"(?i:{_trie(loose)})" if loose else "") if p)
+
+AIRLINE_CODES = sorted(set(GAZETTEER["airlines"].values()))
+# names that are also ordinary words or places ("American Express", "Southwest region") only
+# count with a flight word, flight number or airport next to them
+AMBIGUOUS_AIRLINES = set(GAZETTEER["ambiguous_airlines"])
+AIRPORT_CITY = GAZETTEER["airports"]
+CITY_NAMES = {c.lower(): c for c in GAZETTEER["cities"]}
+
+DESTINATION_RX = re.compile(r"(?:\bto|→)\s*$", re.I)  # right before a city: "to Delhi", "→ Delhi"
+
+_rx = None
+
+def trip_rx() -> re.Pattern:
+    """The combined pattern, compiled on first use to keep it off the import path."""
+    global _rx
+    if _rx is None: _rx = _compile()
+    return _rx
+
+def _compile() -> re.Pattern:
+    return re.compile(
+        rf"\b(?P<flight_number>(?:{_trie(AIRLINE_CODES)}) ?\d{{1,4}})\b"
+        rf"|\b(?P<airport>{_trie(AIRPORT_CITY)})\b"
+        rf"|\b(?P<airline>{_names(set(GAZETTEER['airlines']) - AMBIGUOUS_AIRLINES)})\b"
+        rf"|\b(?P<airline_word>{_names(AMBIGUOUS_AIRLINES)})\b"  # after airline: "American Airlines" wins
+        rf"|\b(?P<flight>{_names(GAZETTEER['flight_words'])})\b"
+        rf"|\b(?P<hotel>{_names(GAZETTEER['hotel_words'])}|{_trie(GAZETTEER['hotel_brands'])})\b"  # brands: exact case
+        rf"|\b(?P<city>{_names(GAZETTEER['cities'])})\b"
+    )
+
+def scan(text: str) -> list[tuple[str, str, int, int]]:
+    """All (kind, text, start, end) spans in one pass."""
+    return [(m.lastgroup, m.group(), m.start(), m.end()) for m in trip_rx().finditer(text)]
+
+@lru_cache(maxsize=65536)  # recurring events repeat the same title/location endlessly
+def classify_text(text: str) -> tuple | None:
+    """(type, city, airport, flight_number) for a trip-like text, else None."""
+    city = airport = flight_number = None
+    flight = hotel = named = bound = False
+    for m in trip_rx().finditer(text):
+        k = m.lastgroup
+        if k in ("airline", "flight"): flight = True
+        elif k == "airline_word": named = True
+        elif k == "hotel": hotel = True
+        if k == "flight_number" and not flight_number: flight_number = m.group().replace(" ", "")
+        elif k == "airport" and not airport: airport = m.group()
+        elif k == "city":
+            if not city: city = CITY_NAMES.get(m.group().lower(), m.group())
+            bound = bound or bool(DESTINATION_RX.search(text, 0, m.start()))
+    # code + digits alone is too common ("PR 482", "MS 365 rollout in Dallas"): it needs a flight
+    # word, airline, airport or a destination ("UA 123 to Chicago"), not just a city mention
+    if flight_number and not (flight or airport or bound or named): flight_number = None
+    if named and (flight_number or airport): flight = True
+    kind = "flight" if flight or flight_number else "hotel" if hotel else None
+    if not kind: return None
+    return kind, city or AIRPORT_CITY.get(airport), airport, flight_number
+
+def extract(events) -> list[Trip]:
+    """Trips from event_model.Event records."""
+    trips = []
+    for ev in events:
+        hit = classify_text((ev.summary or "") + " " + (ev.location or ""))
+        if hit:
+            kind, city, airport, flight_number = hit
+            trips.append(Trip(kind, ev.summary, ev.start, ev.end, city, airport, flight_number))
+    return trips
@@ -0,0 +1,118 @@
+"""
+Per-user text-entry storage: scheduled_data/<email>.txt plus a <email>.settings.json sidecar.
+Appends are a single fsync'd write under an exclusive flock; settings changes never touch the
+lines file; full rewrites (reset, compaction) go through a temp file and an atomic rename.
+Files that still start with the legacy `SETTINGS:{...}` line are read as-is and migrated lazily.
+"""
+import os, re, json, fcntl, pathlib
+from itertools import islice
+from contextlib import contextmanager
+
+DATA_DIR = pathlib.Path(os.getenv("PERSIST_DIR", "scheduled_data")); DATA_DIR.mkdir(parents=True, exist_ok=True)
+APPEND_CHUNK = 1000  # lines buffered per write when appending from a generator
+
+def _safe(email:str)->str: return re.sub(r"[^a-z0-9_.@+-]+","_",email.lower())
+def user_file(email:str)->pathlib.Path: return DATA_DIR / f"{_safe(email)}.txt"
+def settings_file(email:str)->pathlib.Path: return DATA_DIR / f"{_safe(email)}.settings.json"
+
+def _default_settings(): return {"travel_enabled": False, "time_format": "12h"}
+
+@contextmanager
+def locked(email:str, exclusive:bool=True):
+    """Cross-process lock for one user's files."""
+    with open(DATA_DIR / f"{_safe(email)}.lock", "a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try: yield
+        finally: fcntl.flock(fh, fcntl.LOCK_UN)
+
+def _atomic_write(p:pathlib.Path, text:str):
+    tmp = p.with_suffix(p.suffix + f".{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        fh.write(text); fh.flush(); os.fsync(fh.fileno())
+    os.replace(tmp, p)
+
+def _legacy_settings(p:pathlib.Path):
+    if not p.exists(): return None
+    with open(p, encoding="utf-8") as fh: first = fh.readline()
+    if not first.startswith("SETTINGS:"): return None
+    try: return json.loads(first[9:])
+    except Exception: return _default_settings()
+
+# --- Settings -----------------------------------------------------------------
+def read_settings(email:str) -> dict:
+    sp = settings_file(email)
+    if sp.exists(): return json.loads(sp.read_text(encoding="utf-8"))
+    with locked(email):
+        if not sp.exists():  # migrate the SETTINGS: header into the sidecar
+            _atomic_write(sp, json.dumps(_legacy_settings(user_file(email)) or _default_settings()))
+    return json.loads(sp.read_text(encoding="utf-8"))
+
+def write_settings(email:str, settings:dict):
+    with locked(email): _atomic_write(settings_file(email), json.dumps(settings))
+
+def toggle_travel(email:str) -> bool:
+    with locked(email):
+        settings = read_settings(email) if settings_file(email).exists() else \
+            (_legacy_settings(user_file(email)) or _default_settings())
+        settings["travel_enabled"] = not settings.get("travel_enabled", False)
+        _atomic_write(settings_file(email), json.dumps(settings))
+    return settings["travel_enabled"]
+
+# --- Lines --------------------------------------------------------------------
+def _lines(p:pathlib.Path) -> list[str]:
+    if not p.exists(): return []
+    raw = p.read_text(encoding="utf-8").splitlines()
+    if raw and raw[0].startswith("SETTINGS:"): raw = raw[1:]
+    return [ln for ln in raw if ln.strip()]
+
+def read_lines(email:str) -> list[str]:
+    with locked(email, exclusive=False): return _lines(user_file(email))
+
+def read_user_blob(email:str):
+    return read_settings(email), read_lines(email)
+
+def _append(email:str, texts, on_chunk=None) -> int:
+    """Write texts in APPEND_CHUNK-line pieces through one handle and one fsync; texts may be a
+    generator of any length. on_chunk(lines) sees each piece after it is written."""
+    it, n, fh = iter(texts), 0, None
+    try:
+        while chunk := list(islice(it, APPEND_CHUNK)):
+            lines = [t.strip() for t in chunk if t.strip()]
+            if not lines: continue
+            body = "".join(ln + "\n" for ln in lines)
+            if fh is None:
+                fh = open(user_file(email), "a+b")
+                if fh.tell():  # hand-edited files may lack a trailing newline
+                    fh.seek(-1, os.SEEK_END)
+                    if fh.read(1) != b"\n": body = "\n" + body
+            fh.write(body.encode("utf-8")); n += len(lines)
+            if on_chunk: on_chunk(lines)
+        if fh: fh.flush(); os.fsync(fh.fileno())
+    finally:
+        if fh: fh.close()
+    return n
+
+def append_lines(email:str, texts) -> int:
+    """O(1) in history length: buffered writes + one fsync at the end of the file."""
+    with locked(email): return _append(email, texts)
+
+def append_line(email:str, text:str):
+    append_lines(email, [text])
+
+def _rewrite(email:str, settings:dict, lines:list[str]):
+    _atomic_write(settings_file(email), json.dumps(settings))
+    _atomic_write(user_file(email), "".join(ln.strip() + "\n" for ln in lines if ln.strip()))
+
+def write_user_blob(email:str, settings:dict, lines:list[str]):
+    with locked(email): _rewrite(email, settings, lines)
+
+def compact(email:str):
+    """Drop the legacy SETTINGS: header and blank lines; atomic rename."""
+    with locked(email):
+        sp, p = settings_file(email), user_file(email)
+        settings = json.loads(sp.read_text(encoding="utf-8")) if sp.exists() else \
+            (_legacy_settings(p) or _default_settings())
+        _rewrite(email, settings, _lines(p))
+
+def reset_user(email:str):
+    write_user_blob(email, _default_settings(), [])